@@ -9,3 +9,8 @@ __version__ = '.'.join(str(i) for i in version_info)
 # make everything available in root package for convenience
 from .mman import *
 from .buf import *
+from .policy import *
+from .prefetch import *
+from .fileio import *
+from .trace import *
+from .limits import *
@@ -1,7 +1,86 @@
 """Module with a simple buffer implementation using the memory manager"""
 import sys
+import weakref
 
-__all__ = ["SlidingWindowMapBuffer"]
+__all__ = ["SlidingWindowMapBuffer", "WindowSegments"]
+
+
+class WindowSegments:
+
+    """A sequence of memoryviews into consecutive mapped windows of a file, as returned by
+    SlidingWindowMapBuffer.segments(). Together, the views cover the requested range without any copy.
+
+    The regions the views point to stay mapped until release() is called, which happens automatically
+    when leaving a with block, or once the instance is collected. The views must not be used once released."""
+    __slots__ = (
+        '_regions',     # list of regions we keep in use, one per view
+        '_views',       # list of memoryviews
+        '_finalizer',   # weakref.finalize releasing our views and regions
+        '__weakref__'
+    )
+
+    def __init__(self, manager, rlist, regions, views):
+        self._regions = regions
+        self._views = views
+        self._finalizer = weakref.finalize(self, self._release, manager, rlist, regions, views)
+        self._finalizer.atexit = False
+
+    @staticmethod
+    def _release(manager, rlist, regions, views):
+        try:
+            for view in views:
+                try:
+                    view.release()
+                except BufferError:
+                    # the view is still exported, like to struct.iter_unpack - it is released once unreferenced
+                    pass
+                # END handle exported view
+            # END for each view
+        finally:
+            try:
+                with manager._lock:
+                    for region in regions:
+                        manager._release_region(region, rlist)
+                    # END for each region
+                # END with lock
+            except (TypeError, AttributeError):
+                # the interpreter might be shutting down
+                pass
+            # END exception handling
+        # END always release regions
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def __len__(self):
+        return len(self._views)
+
+    def __getitem__(self, i):
+        return self._views[i]
+
+    def __iter__(self):
+        return iter(self._views)
+
+    #{ Interface
+
+    def nbytes(self):
+        """:return: total amount of bytes in all views"""
+        return sum(len(v) for v in self._views)
+
+    def tobytes(self):
+        """:return: a copy of all bytes in all views"""
+        return b''.join(self._views)
+
+    def release(self):
+        """Release all views and allow the manager to unmap their regions. Can be called multiple times"""
+        self._finalizer()
+        self._regions = list()
+        self._views = list()
+
+    #} END interface
 
 
 class SlidingWindowMapBuffer:
@@ -37,9 +116,6 @@ class SlidingWindowMapBuffer:
             raise ValueError("Failed to allocate the buffer - probably the given offset is out of bounds")
         # END handle offset
 
-    def __del__(self):
-        self.end_access()
-
     def __enter__(self):
         return self
 
@@ -97,6 +173,59 @@ class SlidingWindowMapBuffer:
         # END fast or slow path
     #{ Interface
 
+    def segments(self, i=0, j=sys.maxsize):
+        """Obtain the given range of bytes without copying it, as one memoryview per mapped window.
+        The offsets are handled the same way as when slicing this buffer.
+
+        **Note:** as long as the returned WindowSegments exist, the regions they point to cannot be unmapped.
+        Release them as soon as possible
+        :return: WindowSegments instance with views covering the range, or less if the file ended early"""
+        c = self._c
+        assert c.is_valid()
+        if i < 0:
+            i = self._size + i
+        if j == sys.maxsize or j > self._size:
+            j = self._size
+        if j < 0:
+            j = self._size + j
+        # END normalize offsets
+
+        man = c._manager
+        regions = list()
+        views = list()
+        remaining = j - i
+        ofs = i
+        while remaining > 0:
+            if not c.use_region(ofs, remaining).is_valid():
+                break
+            # END handle end of file
+            region = c.region()
+            with man._lock:
+                man._acquire_region(region)
+            # use all of the region, the cursor's size may be limited to the window size
+            rofs = ofs - region._b
+            d = memoryview(region.buffer())[rofs:rofs + remaining]
+            regions.append(region)
+            views.append(d)
+            ofs += len(d)
+            remaining -= len(d)
+        # END while there are bytes to map
+        return WindowSegments(man, c._rlist, regions, views)
+
+    def readinto(self, i, buf):
+        """Copy bytes starting at the given offset into the given writable buffer. The offset is handled
+        the same way as when indexing this buffer.
+
+        :param buf: a writable buffer like a bytearray or memoryview, which will be filled from its start
+        :return: amount of bytes copied, which is less than the size of buf if the end of this buffer was reached"""
+        c = self._c
+        assert c.is_valid()
+        if i < 0:
+            i = self._size + i
+        # END handle negative offset
+        with memoryview(buf) as view, view.cast('B') as dst:
+            return c.readinto(i, dst[:max(self._size - i, 0)])
+
     def begin_access(self, cursor=None, offset=0, size=sys.maxsize, flags=0):
         """Call this before the first use of this instance. The method was already
         called by the constructor in case sufficient information was provided.
@@ -127,8 +256,8 @@ class SlidingWindowMapBuffer:
 
     def end_access(self):
         """Call this method once you are done using the instance. It is automatically
-        called on destruction, and should be called just in time to allow system
-        resources to be freed.
+        called when leaving a with block, and should be called just in time to allow system
+        resources to be freed. Otherwise, the region stays in use until the cursor is released or collected.
 
         Once you called end_access, you must call begin access before reusing this instance!"""
         self._size = 0
@@ -0,0 +1,161 @@
+"""Module with a file object reading from memory mapped windows"""
+import io
+
+__all__ = ["WindowFileIO"]
+
+
+class WindowFileIO(io.RawIOBase):
+
+    """A read-only, seekable binary file object which reads from the windows mapped by a cursor.
+    Reading doesn't require any system call unless a new window has to be mapped, which happens
+    automatically.
+
+    It can be used wherever python expects a binary file, and may be wrapped into an io.BufferedReader.
+
+    **Note:** closing the file object unuses the cursor's current region, but keeps the cursor associated"""
+    __slots__ = (
+        '_c',       # our cursor
+        '_base',    # absolute offset into the file at which our data starts
+        '_size',    # amount of bytes we provide
+        '_pos',     # current position relative to _base
+    )
+
+    def __init__(self, cursor, offset=0, size=None):
+        """Initialize the instance to read from the file of the given cursor
+        :param cursor: a cursor associated with the file to read, as obtained by make_cursor()
+        :param offset: absolute offset into the file which corresponds to position 0
+        :param size: amount of bytes to provide. If None, all bytes up to the end of the file are provided
+        :raise ValueError: if the cursor is not associated with a file"""
+        super().__init__()
+        # assigned first, as close() is called upon destruction even if we raise
+        self._c = cursor
+        if not cursor.is_associated():
+            raise ValueError("Cursor must be associated with a file")
+        # END handle invalid cursor
+        fsize = cursor.file_size()
+        self._base = offset
+        self._size = max(fsize - offset, 0) if size is None else min(size, max(fsize - offset, 0))
+        self._pos = 0
+
+    #{ RawIOBase Interface
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError("Invalid whence: %r" % whence)
+        # END handle whence
+        if pos < 0:
+            raise ValueError("Negative seek position %i" % pos)
+        # END handle negative position
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        self._checkClosed()
+        with memoryview(b) as view, view.cast('B') as dst:
+            num_bytes = self._c.readinto(self._base + self._pos, dst[:max(self._size - self._pos, 0)])
+        self._pos += num_bytes
+        return num_bytes
+
+    def read(self, size=-1):
+        self._checkClosed()
+        remaining = max(self._size - self._pos, 0)
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        # END clamp size
+        if size == 0:
+            return b''
+        # END handle nothing to read
+
+        # single copy out of the memory map if one window contains everything
+        ofs = self._base + self._pos
+        c = self._c
+        if c.use_region(ofs, size).is_valid():
+            region = c.region()
+            if region.includes_ofs(ofs + size - 1):
+                rofs = ofs - region._b
+                self._pos += size
+                return region.map()[rofs:rofs + size]
+            # END handle single window
+        # END handle valid region
+
+        buf = bytearray(size)
+        num_bytes = self.readinto(buf)
+        del buf[num_bytes:]
+        return bytes(buf)
+
+    def readall(self):
+        return self.read()
+
+    def readline(self, size=-1):
+        self._checkClosed()
+        end = self._size
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        # END handle size limit
+
+        c = self._c
+        tokens = list()
+        while self._pos < end:
+            ofs = self._base + self._pos
+            if not c.use_region(ofs, end - self._pos).is_valid():
+                break
+            # END handle end of file
+            region = c.region()
+            mf = region.map()
+            rofs = ofs - region._b
+            rend = min(region.size(), rofs + end - self._pos)
+            nl = mf.find(b'\n', rofs, rend)
+            if nl > -1:
+                rend = nl + 1
+            # END handle newline
+            tokens.append(mf[rofs:rend])
+            self._pos += rend - rofs
+            if nl > -1:
+                break
+            # END handle line complete
+        # END while there are bytes to scan
+        return b''.join(tokens)
+
+    def close(self):
+        if not self.closed:
+            self._c.unuse_region()
+        # END handle cursor
+        super().close()
+
+    #} END RawIOBase interface
+
+    #{ Interface
+
+    def peek(self, size=0):
+        """:return: up to the given amount of bytes at the current position, without changing it.
+            If size is smaller than 1, up to io.DEFAULT_BUFFER_SIZE bytes are returned"""
+        pos = self._pos
+        data = self.read(size if size > 0 else io.DEFAULT_BUFFER_SIZE)
+        self._pos = pos
+        return data
+
+    def cursor(self):
+        """:return: the cursor we use to read the file"""
+        return self._c
+
+    #} END interface
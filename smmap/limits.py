@@ -0,0 +1,146 @@
+"""Module with utilities to determine the memory and file handle limits the process is subject to,
+to derive the limits of memory managers from them"""
+import os
+import sys
+
+try:
+    import resource
+except ImportError:
+    # file handle limits cannot be queried on this platform
+    resource = None
+# END handle resource module
+
+__all__ = ["memory_limit", "open_files_limit", "auto_limits"]
+
+#{ Configuration
+
+#: root of the cgroup file system
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+#: the file with the cgroups of our process
+PROC_CGROUP = '/proc/self/cgroup'
+
+#: the file with the amount of memory of the system
+PROC_MEMINFO = '/proc/meminfo'
+
+#} END configuration
+
+#{ Utilities
+
+
+def _read_int(path):
+    """:return: the integer stored in the given file, or None if it can't be read or the value is 'max'"""
+    try:
+        with open(path) as fp:
+            value = fp.read().strip()
+    except OSError:
+        return None
+    # END handle unreadable file
+    if not value.isdigit():
+        return None
+    return int(value)
+
+
+def _cgroup_paths():
+    """:return: list of tuple(controllers, path) of the cgroups our process belongs to.
+        controllers is an empty string for cgroup v2"""
+    try:
+        with open(PROC_CGROUP) as fp:
+            lines = fp.read().splitlines()
+    except OSError:
+        return list()
+    # END handle no cgroups
+    res = list()
+    for line in lines:
+        tokens = line.split(':', 2)
+        if len(tokens) == 3:
+            res.append((tokens[1], tokens[2]))
+        # END handle valid line
+    # END for each line
+    return res
+
+
+def _cgroup_memory_limit():
+    """:return: the memory limit of our cgroup in bytes, considering all parent groups, or None"""
+    limits = list()
+    for controllers, path in _cgroup_paths():
+        if controllers == '':
+            # cgroup v2 - each level of the hierarchy may have its own limit
+            names = [name for name in path.split('/') if name]
+            for i in range(len(names), -1, -1):
+                limits.append(_read_int(os.path.join(CGROUP_ROOT, *names[:i], 'memory.max')))
+            # END for each level
+        elif 'memory' in controllers.split(','):
+            # cgroup v1 - containers usually see their own group at the root of the hierarchy
+            names = [name for name in path.split('/') if name]
+            for base in (os.path.join(CGROUP_ROOT, 'memory', *names), os.path.join(CGROUP_ROOT, 'memory')):
+                limits.append(_read_int(os.path.join(base, 'memory.limit_in_bytes')))
+            # END for each possible location
+        # END handle version
+    # END for each cgroup
+    limits = [limit for limit in limits if limit]
+    if not limits:
+        return None
+    return min(limits)
+
+
+def _total_memory():
+    """:return: total amount of physical memory in bytes according to /proc/meminfo, or None"""
+    try:
+        with open(PROC_MEMINFO) as fp:
+            for line in fp:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) * 1024
+                # END found total
+            # END for each line
+    except (OSError, ValueError, IndexError):
+        pass
+    # END handle no meminfo
+    return None
+
+#} END utilities
+
+#{ Interface
+
+
+def memory_limit():
+    """:return: the amount of memory in bytes the process may use, being the smaller one of the memory limit
+        of its cgroup (v1 or v2) and the total memory of the system, or None if neither is known"""
+    limits = [limit for limit in (_cgroup_memory_limit(), _total_memory()) if limit is not None]
+    if not limits:
+        return None
+    return min(limits)
+
+
+def open_files_limit():
+    """:return: the soft limit of open file descriptors of the process, or None if it is unknown or unlimited"""
+    if resource is None:
+        return None
+    # END handle no support
+    try:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (AttributeError, OSError, ValueError):
+        return None
+    # END handle unsupported limit
+    if soft == resource.RLIM_INFINITY or soft < 0:
+        return None
+    return soft
+
+
+def auto_limits(default_memory_size, default_open_handles=sys.maxsize, memory_fraction=0.5, handles_fraction=0.5):
+    """:return: tuple(max_memory_size, max_open_handles) using the given fractions of the limits of the process,
+        but not more than the given defaults, which are also used if a limit is unknown"""
+    max_memory_size = default_memory_size
+    limit = memory_limit()
+    if limit is not None:
+        max_memory_size = max(min(int(limit * memory_fraction), default_memory_size), 1)
+    # END handle memory limit
+
+    max_open_handles = default_open_handles
+    limit = open_files_limit()
+    if limit is not None:
+        max_open_handles = max(min(int(limit * handles_fraction), default_open_handles), 1)
+    # END handle handle limit
+    return max_memory_size, max_open_handles
+
+#} END interface
@@ -3,15 +3,80 @@ from .util import (
     MapWindow,
     MapRegion,
     MapRegionList,
+    AccessPattern,
     is_64_bit,
+    align_to_mmap,
+    MADV_DONTNEED,
+    ACCESS_READ,
+    ACCESS_WRITE,
+    ACCESS_COPY,
+    ALLOCATIONGRANULARITY,
+    HUGE_PAGE_SIZE,
 )
 
+from .policy import LRUPolicy
+from .prefetch import WindowPrefetcher
+from .trace import Probe
+from . import limits
+
+import os
+import re
 import sys
-from functools import reduce
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from threading import RLock
+from time import monotonic
+import weakref
 
-__all__ = ["StaticWindowMapManager", "SlidingWindowMapManager", "WindowCursor"]
+__all__ = ["StaticWindowMapManager", "SlidingWindowMapManager", "ShardedWindowMapManager", "WindowCursor"]
 #{ Utilities
 
+
+def _release_cursor_state(state):
+    """Finalizer of cursors which were not released explicitly. Releases the region the cursor used,
+    and forgets about its file if no region of it is mapped anymore
+    :param state: list(manager, regions, region) as kept up to date by the cursor"""
+    man, rlist, region = state
+    if man is None or rlist is None:
+        return
+    # END handle unassociated cursor
+    try:
+        if region is not None:
+            man._unpin_region(region, rlist)
+        # END handle region
+        if not rlist:
+            man._forget_file(rlist)
+        # END forget file
+    except (TypeError, AttributeError):
+        # the interpreter might be shutting down
+        pass
+    # END exception handling
+
+
+def _close_pooled_fds(pool):
+    """Finalizer of managers, closing the file descriptors they kept open to map windows
+    :param pool: the manager's ordered mapping of id(regions) -> regions with an open file descriptor"""
+    for regions in pool.values():
+        try:
+            os.close(regions._fd)
+        except OSError:
+            pass
+        # END ignore closed descriptors
+        regions._fd = None
+    # END for each pooled descriptor
+    pool.clear()
+
+
+def _release_pinned_region(man, rlist, region):
+    """Finalizer of arrays viewing the memory of a region, see WindowCursor.as_array()"""
+    try:
+        with man._lock:
+            man._release_region(region, rlist)
+    except (TypeError, AttributeError):
+        # the interpreter might be shutting down
+        pass
+    # END exception handling
+
 #}END utilities
 
 
@@ -23,6 +88,10 @@ class WindowCursor:
 
     Cursors should not be created manually, but are instead returned by the SlidingWindowMapManager
 
+    Cursors should be released using release() or a with block once they are not needed anymore. Otherwise,
+    the region they use is released once they are collected. Cursors obtained by acquire_cursor() are returned
+    to the manager upon release, and must not be used afterwards
+
     **Note:**: The current implementation is suited for static and sliding window managers, but it also means
     that it must be suited for the somewhat quite different sliding manager. It could be improved, but
     I see no real need to do so."""
@@ -31,60 +100,75 @@ class WindowCursor:
         '_rlist',   # a regions list with regions for our file
         '_region',  # our current class:`MapRegion` or None
         '_ofs',     # relative offset from the actually mapped area to our start area
-        '_size'     # maximum size we should provide
+        '_size',    # maximum size we should provide
+        '_advice',  # access pattern hint for the regions we use, or None
+        '_state',   # list(manager, regions, region) used by our finalizer, or None if we never used a region
+        '_pooled',  # if True, we are returned to the manager's cursor pool once released
+        '__weakref__'
     )
 
-    def __init__(self, manager=None, regions=None):
+    def __init__(self, manager=None, regions=None, advice=None):
         self._manager = manager
         self._rlist = regions
         self._region = None
         self._ofs = 0
         self._size = 0
-
-    def __del__(self):
-        self._destroy()
+        self._advice = advice
+        self._state = None
+        self._pooled = False
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._destroy()
+        self.release()
+
+    def _hold(self, region):
+        """Make the given region, or None, our current region, and keep our finalizer informed about it"""
+        self._region = region
+        state = self._state
+        if state is None:
+            if region is None:
+                return
+            # END handle nothing to release
+            # a finalizer is cheaper than __del__, and only required once we actually use regions
+            state = self._state = [self._manager, self._rlist, region]
+            weakref.finalize(self, _release_cursor_state, state).atexit = False
+            return
+        # END handle no finalizer
+        state[0] = self._manager
+        state[1] = self._rlist
+        state[2] = region
 
     def _destroy(self):
         """Destruction code to decrement counters"""
         self.unuse_region()
 
-        if self._rlist is not None:
-            # Actual client count, which doesn't include the reference kept by the manager, nor ours
-            # as we are about to be deleted
+        # without any mapped region, free all resources associated with the mapped file
+        if self._rlist is not None and not self._rlist:
             try:
-                if len(self._rlist) == 0:
-                    # Free all resources associated with the mapped file
-                    self._manager._fdict.pop(self._rlist.path_or_fd())
-                # END remove regions list from manager
-            except (TypeError, KeyError):
-                # sometimes, during shutdown, getrefcount is None. Its possible
-                # to re-import it, however, its probably better to just ignore
-                # this python problem (for now).
-                # The next step is to get rid of the error prone getrefcount altogether.
+                self._manager._forget_file(self._rlist)
+            except (TypeError, AttributeError):
+                # the interpreter might be shutting down
                 pass
             # END exception handling
         # END handle regions
 
     def _copy_from(self, rhs):
-        """Copy all data from rhs into this instance, handles usage count"""
+        """Copy all data from rhs into this instance, handles usage count.
+        The regions list is shared, only the current region is used once more"""
         self._manager = rhs._manager
-        self._rlist = type(rhs._rlist)(rhs._rlist)
-        self._region = rhs._region
+        self._rlist = rhs._rlist
         self._ofs = rhs._ofs
         self._size = rhs._size
+        self._advice = rhs._advice
 
-        for region in self._rlist:
-            region.increment_client_count()
-
-        if self._region is not None:
-            self._region.increment_client_count()
-        # END handle regions
+        region = rhs._region
+        if region is not None:
+            # rhs keeps the region mapped, pinning it once more is safe
+            region._pins.append(None)
+        # END handle region
+        self._hold(region)
 
     def __copy__(self):
         """copy module interface"""
@@ -99,43 +183,109 @@ class WindowCursor:
         self._destroy()
         self._copy_from(rhs)
 
-    def use_region(self, offset=0, size=0, flags=0):
+    def release(self):
+        """Unuse our region and allow the manager to forget about our file if no other cursor maps it.
+        If we were obtained by acquire_cursor(), we are returned to the manager to be reused, and must
+        not be used anymore. Called automatically when leaving a with block. Releasing a cursor
+        more than once has no effect"""
+        self._destroy()
+        if self._pooled and self._rlist is not None:
+            self._manager._return_cursor(self)
+        # END handle pooled cursor
+
+    def use_region(self, offset=0, size=0, flags=0, advice=None):
         """Assure we point to a window which allows access to the given offset into the file
 
         :param offset: absolute offset in bytes into the file
         :param size: amount of bytes to map. If 0, all available bytes will be mapped
         :param flags: additional flags to be given to os.open in case a file handle is initially opened
             for mapping. Has no effect if a region can actually be reused.
+        :param advice: one of the MADV_* constants, hinting the kernel how the region will be accessed.
+            If None, the hint given when creating the cursor will be applied to newly used regions.
         :return: this instance - it should be queried for whether it points to a valid memory region.
             This is not the case if the mapping failed because we reached the end of the file
 
         **Note:**: The size actually mapped may be smaller than the given size. If that is the case,
         either the file has reached its end, or the map was created between two existing regions"""
-        need_region = True
         man = self._manager
-        fsize = self._rlist.file_size()
-        size = min(size or fsize, man.window_size() or fsize)   # clamp size to window size
-
-        if self._region is not None:
-            if self._region.includes_ofs(offset):
-                need_region = False
-            else:
-                self.unuse_region()
+        rlist = self._rlist
+        fsize = rlist.file_size()
+        size = min(size or fsize, man._window_size_of(rlist) or fsize)   # clamp size to window size
+        region = self._region
+
+        # fast path: our current region can serve the request
+        if region is None or not region.includes_ofs(offset):
+            prev_region = region
+            if region is not None:
+                self._hold(None)
+                man._unpin_region(region, rlist)
             # END handle existing region
-        # END check existing region
 
-        # offset too large ?
-        if offset >= fsize:
-            return self
-        # END handle offset
-
-        if need_region:
-            self._region = man._obtain_region(self._rlist, offset, size, flags, False)
-            self._region.increment_client_count()
+            # hits on existing regions don't require the manager's lock. A region found without it might be
+            # about to be unmapped, which is the case if it is detached once we pinned it
+            try:
+                region = rlist.find_region(offset)
+            except IndexError:
+                # the list changed while we searched it
+                region = None
+            # END handle concurrent modification
+            if region is not None:
+                pins = region._pins
+                pins.append(None)
+                if region._detached or not region.includes_ofs(offset):
+                    man._unpin_region(region, rlist)
+                    region = None
+                else:
+                    log = man._hit_log
+                    log.append((region, rlist, offset, size))
+                    if len(log) >= man.max_logged_hits:
+                        with man._lock:
+                            man._replay_hits()
+                    # END pass hits to the policy
+                # END handle detached region
+            # END handle hit
+
+            if region is None:
+                with man._lock:
+                    man._replay_hits()
+                    # offset too large ? The file might have grown in the meanwhile
+                    if offset >= fsize:
+                        if not man._track_growth:
+                            return self
+                        # END handle static file size
+                        fsize = man._refresh_file_size(rlist)
+                        if offset >= fsize:
+                            return self
+                        # END handle offset
+                        size = min(size or fsize, man._window_size_of(rlist) or fsize)
+                    # END handle offset
+
+                    region = man._obtain_region(rlist, offset, size, flags, False)
+                    region._pins.append(None)
+                    if region._uc == 1 and not region._detached:
+                        man._policy.touch(region, rlist)
+                    # END record access
+                # END with lock
+            # END handle miss
+            self._hold(region)
+
+            # moving on to the next window indicates sequential access - map the one after it early
+            if (man._prefetcher is not None and prev_region is not None and
+                    0 <= offset - prev_region.ofs_end() < region.size()):
+                with man._lock:
+                    man._prefetcher.schedule(rlist, region.ofs_end(), flags)
+            # END handle prefetching
+            if advice is None:
+                advice = self._advice
+            # END use default advice
         # END need region handling
 
-        self._ofs = offset - self._region._b
-        self._size = min(size, self._region.ofs_end() - offset)
+        if advice is not None and region._advice != advice:
+            region.advise(advice)
+        # END apply access pattern hint
+
+        self._ofs = offset - region._b
+        self._size = min(size, region.ofs_end() - offset)
 
         return self
 
@@ -145,9 +295,11 @@ class WindowCursor:
         **Note:** the cursor unuses the region automatically upon destruction. It is recommended
         to un-use the region once you are done reading from it in persistent cursors as it
         helps to free up resource more quickly"""
-        if self._region is not None:
-            self._region.increment_client_count(-1)
-        self._region = None
+        region = self._region
+        if region is not None:
+            self._hold(None)
+            self._manager._unpin_region(region, self._rlist)
+        # END handle region
         # note: should reset ofs and size, but we spare that for performance. Its not
         # allowed to query information if we are not valid !
 
@@ -161,6 +313,388 @@ class WindowCursor:
         prevent resources from being freed even though they might not be accounted for anymore !"""
         return memoryview(self._region.buffer())[self._ofs:self._ofs+self._size]
 
+    def file_view(self):
+        """Return a read-only memoryview of the whole file, which makes us use the region mapping it.
+        The view is cached by the region, hence accessing the file costs no more than slicing the view.
+        This is meant for cursors of a StaticWindowMapManager, which maps each file using a single region.
+
+        :return: memoryview of all bytes of the file, which is empty if the file is empty
+        :raise ValueError: if the file is not mapped by a single region, as it is larger than the window size
+
+        **Note:** the view may only be used until we are released or use another region, as the manager
+        may unmap it afterwards. Keeping slices of it alive beyond that keeps the memory map alive as well,
+        without it being accounted for by the manager"""
+        region = self._region
+        fsize = self._rlist.file_size()
+        if region is None or region._b != 0 or region._size < fsize:
+            if not self.use_region(0).is_valid():
+                return memoryview(b'')
+            # END handle empty file
+            region = self._region
+            if region._size < fsize:
+                raise ValueError("File of %i bytes is not mapped by a single window of at most %i bytes"
+                                 % (fsize, self._manager._window_size_of(self._rlist)))
+            # END handle partial mapping
+        # END obtain whole file
+        return region.view()
+
+    def as_array(self, offset, dtype, count=-1):
+        """Provide count items of the given numpy dtype at the given absolute offset as numpy array.
+        Requires numpy, which is imported on first use.
+
+        If all items are within one window, the array is a read-only view of the mapped memory, which
+        doesn't copy anything. The region stays in use by the array until it is collected, independently
+        of this cursor, and can't be unmapped before.
+        Otherwise, as the items span multiple windows, they are **copied** into a new writable array.
+        Use a StaticWindowMapManager or a window size larger than the array to always obtain views.
+
+        :param offset: absolute offset in bytes into the file
+        :param dtype: anything numpy accepts as dtype, like 'u4' or '>u8'
+        :param count: amount of items, or -1 for as many items as fit into the remainder of the file
+        :return: one-dimensional numpy array
+        :raise ValueError: if the items are not entirely within the file
+        :raise ImportError: if numpy is not available"""
+        import numpy    # optional dependency, only imported when needed as it takes a while
+
+        dtype = numpy.dtype(dtype)
+        fsize = self._rlist.file_size()
+        if count < 0:
+            count = max(fsize - offset, 0) // dtype.itemsize
+        # END handle remainder of file
+        size = count * dtype.itemsize
+        if offset < 0 or offset + size > fsize:
+            raise ValueError("Cannot provide %i bytes at offset %i of a file of %i bytes" % (size, offset, fsize))
+        # END handle invalid range
+        if size == 0:
+            return numpy.empty(0, dtype)
+        # END handle empty array
+
+        region = self.use_region(offset, size)._region
+        if region.includes_ofs(offset + size - 1):
+            rofs = offset - region._b
+            arr = numpy.frombuffer(region.view()[rofs:rofs + size], dtype, count)
+            # the array pins the region, the manager may not unmap it while the array is alive
+            man = self._manager
+            with man._lock:
+                man._acquire_region(region)
+            weakref.finalize(arr, _release_pinned_region, man, self._rlist, region).atexit = False
+            return arr
+        # END handle single window
+
+        buf = bytearray(size)
+        self._readinto(offset, buf)
+        return numpy.frombuffer(buf, dtype, count)
+
+    def readinto(self, offset, buf):
+        """Copy bytes starting at the given absolute offset into the given writable buffer, using as many
+        windows as required. The cursor will point to the window containing the last byte read afterwards.
+
+        :param offset: absolute offset in bytes into the file
+        :param buf: a writable buffer like a bytearray or memoryview, which will be filled from its start
+        :return: amount of bytes copied, which is less than the size of buf only if the end of the file was reached"""
+        tracer = self._manager._tracer
+        if tracer is None:
+            return self._readinto(offset, buf)
+        # END handle no tracing
+        probe = Probe()
+        num_bytes = self._readinto(offset, buf)
+        tracer.read(self._rlist, offset, num_bytes, *probe.stop())
+        return num_bytes
+
+    def _readinto(self, offset, buf):
+        with memoryview(buf) as view, view.cast('B') as dst:
+            num_bytes = len(dst)
+            pos = 0
+            while pos < num_bytes:
+                if not self.use_region(offset + pos, num_bytes - pos).is_valid():
+                    break
+                # END handle end of file
+                region = self._region
+                rofs = offset + pos - region._b
+                count = min(num_bytes - pos, region._size - rofs)
+                dst[pos:pos + count] = memoryview(region._mf)[rofs:rofs + count]
+                pos += count
+            # END while there are bytes to copy
+        return pos
+
+    def read(self, offset, size):
+        """:return: copy of the given amount of bytes at the given absolute offset, which is shorter
+            if the end of the file is reached. Uses as many windows as required"""
+        tracer = self._manager._tracer
+        if tracer is None:
+            return self._read(offset, size)
+        # END handle no tracing
+        probe = Probe()
+        data = self._read(offset, size)
+        tracer.read(self._rlist, offset, len(data), *probe.stop())
+        return data
+
+    def _read(self, offset, size):
+        if self.use_region(offset, size).is_valid():
+            region = self._region
+            if region.includes_ofs(offset + size - 1):
+                rofs = offset - region._b
+                return region._mf[rofs:rofs + size]
+            # END handle single window
+        # END handle valid region
+        fsize = self._rlist.file_size()
+        if offset + size > fsize and self._manager._track_growth:
+            fsize = self.refresh_file_size()
+        # END handle growing file
+        buf = bytearray(max(min(size, fsize - offset), 0))
+        del buf[self._readinto(offset, buf):]
+        return bytes(buf)
+
+    def read_many(self, ranges):
+        """Read multiple ranges of bytes at once. The ranges are read in order of their offset, and ranges
+        lying close together are read from one window, which is mapped only once.
+
+        :param ranges: sequence of tuple(offset, size) with absolute offsets into the file
+        :return: list with a copy of the bytes of each range, in the order of the given ranges. Each item
+            is shorter than requested if the end of the file was reached"""
+        order = sorted(range(len(ranges)), key=lambda i: ranges[i][0])
+        results = [None] * len(ranges)
+        window_size = self._manager._window_size_of(self._rlist) or self._rlist.file_size()
+        read = self.read
+
+        i = 0
+        while i < len(order):
+            # gather all following ranges fitting into one window with the first one
+            gstart, size = ranges[order[i]]
+            gend = gstart + size
+            j = i + 1
+            while j < len(order):
+                ofs, size = ranges[order[j]]
+                if max(gend, ofs + size) - gstart > window_size:
+                    break
+                # END handle window full
+                gend = max(gend, ofs + size)
+                j += 1
+            # END while ranges fit into the window
+
+            if gend > gstart:
+                self.use_region(gstart, gend - gstart)
+            # END map window for all ranges
+            for k in order[i:j]:
+                ofs, size = ranges[k]
+                results[k] = read(ofs, size)
+            # END for each range in window
+            i = j
+        # END for each group of ranges
+        return results
+
+    def write(self, offset, data):
+        """Copy the given bytes into the file at the given absolute offset, using as many windows as required.
+        The windows written to are flushed to the file once the manager's dirty limit is exceeded, once they are
+        unmapped, or when calling flush(). The file is not extended, bytes beyond its end are not written.
+
+        :param data: a bytes-like object
+        :return: amount of bytes written, which is less than the size of data only if the end of the file was reached
+        :raise ValueError: if the file was not mapped with ACCESS_WRITE or ACCESS_COPY, see make_cursor()"""
+        if self._rlist.access() == ACCESS_READ:
+            raise ValueError("Cannot write to a file mapped with ACCESS_READ")
+        # END handle read-only file
+        man = self._manager
+        with memoryview(data) as view, view.cast('B') as src:
+            num_bytes = len(src)
+            pos = 0
+            while pos < num_bytes:
+                if not self.use_region(offset + pos, num_bytes - pos).is_valid():
+                    break
+                # END handle end of file
+                region = self._region
+                rofs = offset + pos - region._b
+                count = min(num_bytes - pos, region._size - rofs)
+                memoryview(region._mf)[rofs:rofs + count] = src[pos:pos + count]
+                with man._lock:
+                    man._mark_dirty(region, self._rlist, rofs, count)
+                pos += count
+            # END while there are bytes to copy
+        return pos
+
+    def mark_dirty(self):
+        """Record that the bytes provided by buffer() were written to, so that they will be written to the file.
+        This is only required when writing through buffer() or map() instead of write()
+
+        **Note:** only if is_valid() is True"""
+        with self._manager._lock:
+            self._manager._mark_dirty(self._region, self._rlist, self._ofs, self._size)
+
+    def flush(self):
+        """Write all changes to windows of our file to the file
+        :return: amount of regions which were written"""
+        with self._manager._lock:
+            return self._manager._flush_dirty(self._rlist)
+
+    def _search_range(self, start, end):
+        """:return: tuple(start, end) of absolute offsets clamped to the file"""
+        fsize = self._rlist.file_size()
+        if end is None or end > fsize:
+            end = fsize
+        # END clamp end
+        return max(start, 0), end
+
+    def find(self, sub, start=0, end=None):
+        """Find the first occurrence of the given bytes in the file, searching all windows in the given range.
+        Occurrences spanning multiple windows are found as well.
+
+        :param sub: bytes to search
+        :param start: absolute offset at which to start searching
+        :param end: absolute offset at which the search ends, or None to search up to the end of the file
+        :return: absolute offset of the first occurrence of sub, or -1 if it was not found"""
+        start, end = self._search_range(start, end)
+        n = len(sub)
+        if n == 0:
+            return start if start <= end else -1
+        # END handle empty needle
+
+        tail = b''      # up to n - 1 bytes preceding pos, to find occurrences spanning windows
+        pos = start
+        while pos < end:
+            if not self.use_region(pos, end - pos).is_valid():
+                break
+            # END handle end of file
+            region = self._region
+            mf = region._mf
+            b = region._b
+            rofs = pos - b
+            rend = min(region._size, end - b)
+            if tail:
+                idx = (tail + mf[rofs:min(rofs + n - 1, rend)]).find(sub)
+                if idx > -1:
+                    return pos - len(tail) + idx
+                # END found spanning occurrence
+            # END handle window boundary
+            idx = mf.find(sub, rofs, rend)
+            if idx > -1:
+                return b + idx
+            # END found occurrence
+            if n > 1:
+                tail = (tail + mf[max(rend - (n - 1), rofs):rend])[-(n - 1):]
+            # END keep tail
+            pos = b + rend
+        # END for each window
+        return -1
+
+    def rfind(self, sub, start=0, end=None):
+        """Find the last occurrence of the given bytes in the file, searching all windows in the given range
+        from its end. Occurrences spanning multiple windows are found as well.
+
+        :param sub: bytes to search
+        :param start: absolute offset at which the search ends
+        :param end: absolute offset at which to start searching backwards, or None to start at the end of the file
+        :return: absolute offset of the last occurrence of sub, or -1 if it was not found"""
+        start, end = self._search_range(start, end)
+        n = len(sub)
+        if n == 0:
+            return end if start <= end else -1
+        # END handle empty needle
+
+        head = b''      # up to n - 1 bytes following pos, to find occurrences spanning windows
+        pos = end
+        while pos > start:
+            if not self.use_region(pos - 1, 1).is_valid():
+                break
+            # END handle invalid offset
+            region = self._region
+            mf = region._mf
+            b = region._b
+            rofs = max(start - b, 0)
+            rend = pos - b
+            if head:
+                lead = mf[max(rend - (n - 1), rofs):rend]
+                idx = (lead + head).rfind(sub)
+                if idx > -1:
+                    return pos - len(lead) + idx
+                # END found spanning occurrence
+            # END handle window boundary
+            idx = mf.rfind(sub, rofs, rend)
+            if idx > -1:
+                return b + idx
+            # END found occurrence
+            if n > 1:
+                head = (mf[rofs:min(rofs + n - 1, rend)] + head)[:n - 1]
+            # END keep head
+            pos = b + rofs
+        # END for each window
+        return -1
+
+    def count(self, sub, start=0, end=None):
+        """:return: amount of non-overlapping occurrences of the given bytes in the given range of the file.
+            See find() for more information about the parameters"""
+        start, end = self._search_range(start, end)
+        n = len(sub)
+        if n == 0:
+            return max(end - start + 1, 0)
+        # END handle empty needle
+        num_found = 0
+        pos = self.find(sub, start, end)
+        while pos > -1:
+            num_found += 1
+            pos = self.find(sub, pos + n, end)
+        # END while there are occurrences
+        return num_found
+
+    def finditer(self, pattern, start=0, end=None, overlap=4096):
+        """Find all non-overlapping matches of the given regular expression in the given range of the file.
+        Windows are searched directly, but to find matches spanning windows, the last overlap bytes of a
+        window are copied and searched together with the first overlap bytes of the next one.
+
+        :param pattern: compiled bytes pattern or bytes to compile into one
+        :param overlap: maximum length of a match. Longer matches may be truncated or missed if they
+            span windows
+        :return: iterator yielding tuple(offset, match) for each match. offset is the absolute offset of
+            the match in the file. The positions of the match object are relative to the buffer that
+            was searched, and it must not be used anymore once the iteration continues.
+
+        **Note:** the cursor is used to map windows, and must not be used otherwise during the iteration.
+        Anchors and look-around assertions only see the data of the buffer searched at a time"""
+        if not hasattr(pattern, 'finditer'):
+            pattern = re.compile(pattern)
+        # END compile pattern
+        start, end = self._search_range(start, end)
+        pos = start
+        while pos < end:
+            if not self.use_region(pos, end - pos).is_valid():
+                break
+            # END handle end of file
+            region = self._region
+            b = region._b
+            wend = min(region.ofs_end(), end)
+            safe = wend
+            if wend < end:
+                safe = max(wend - overlap, pos)
+            # END handle last window
+
+            # matches starting in front of the safe offset cannot span into the next window
+            last_end = pos
+            if pos < safe:
+                for m in pattern.finditer(region._mf, pos - b, wend - b):
+                    if b + m.start() >= safe:
+                        break
+                    # END handle unsafe match
+                    last_end = b + m.end()
+                    yield b + m.start(), m
+                # END for each match
+                pos = max(safe, last_end)
+            # END search window
+
+            # search the rest of the window together with the start of the next one
+            if pos < wend:
+                chunk = bytearray(min(wend + overlap, end) - pos)
+                del chunk[self.readinto(pos, chunk):]
+                last_end = pos
+                for m in pattern.finditer(chunk):
+                    if pos + m.start() >= wend:
+                        break
+                    # END handle match in next window
+                    last_end = pos + m.end()
+                    yield pos + m.start(), m
+                # END for each match
+                pos = max(wend, last_end)
+            # END handle window boundary
+        # END for each window
+
     def map(self):
         """
         :return: the underlying raw memory map. Please not that the offset and size is likely to be different
@@ -168,6 +702,19 @@ class WindowCursor:
             file in case of StaticWindowMapManager"""
         return self._region.map()
 
+    def advice(self):
+        """:return: the access pattern hint applied to regions we use, or None"""
+        return self._advice
+
+    def window_size(self):
+        """:return: size of the windows mapped for our file, which may change over time if the manager
+            adapts it to the way the file is accessed"""
+        return self._manager._window_size_of(self._rlist)
+
+    def access(self):
+        """:return: the mmap.ACCESS_* constant the regions of our file are mapped with"""
+        return self._rlist.access()
+
     def is_valid(self):
         """:return: True if we have a valid and usable region"""
         return self._region is not None
@@ -208,6 +755,12 @@ class WindowCursor:
         """:return: size of the underlying file"""
         return self._rlist.file_size()
 
+    def refresh_file_size(self):
+        """Check the size of the underlying file again, to be able to access data appended to it
+        :return: the new size of the file"""
+        with self._manager._lock:
+            return self._manager._refresh_file_size(self._rlist)
+
     def path_or_fd(self):
         """:return: path or file descriptor of the underlying mapped file"""
         return self._rlist.path_or_fd()
@@ -253,6 +806,32 @@ class StaticWindowMapManager:
         '_max_handle_count',        # maximum amount of handles to keep open
         '_memory_size',     # currently allocated memory size
         '_handle_count',        # amount of currently allocated file handles
+        '_policy',          # the policy deciding which unused region to unmap next
+        '_lock',            # lock protecting our state, or a no-op context manager if we are not thread-safe
+        '_prefetcher',      # WindowPrefetcher mapping windows ahead of sequential readers, or None
+        '_track_growth',    # if True, the file size is checked again when reading beyond its end
+        '_fd_pool',         # ordered mapping of id(regions) -> regions with an open file descriptor, LRU first
+        '_max_pooled_fds',  # maximum amount of file descriptors in the pool
+        '_dirty',           # ordered mapping of region -> regions of regions written to since their last flush
+        '_dirty_size',      # amount of bytes written to since they were last flushed
+        '_max_dirty_size',  # amount of dirty bytes at which all dirty regions are flushed
+        '_huge_pages',      # if True, windows are aligned to huge pages which are requested from the kernel
+        '_prefault',        # if True, all pages of a window are read when mapping it
+        '_num_open_files',  # amount of files with at least one mapped region
+        '_num_hits',        # amount of times a cursor obtained an already mapped region
+        '_num_maps',        # amount of regions mapped so far
+        '_num_evictions',   # amount of unused regions unmapped to free resources
+        '_num_collections',  # amount of times unused regions had to be collected
+        '_num_map_retries',  # amount of times mapping failed and was retried after collecting all unused regions
+        '_peak_memory_size',  # highest amount of mapped memory so far
+        '_tracer',          # Tracer informed about the operations we perform, or None
+        '_window_bounds',   # tuple(min, max) window size of files whose window size adapts to their use, or None
+        '_auto_limits',     # tuple(memory, handles, dirty) of bools telling which limits are derived from the system
+        '_limits_interval',  # seconds after which limits derived from the system are determined again, or 0
+        '_limits_deadline',  # monotonic() time at which to determine the limits again, or None
+        '_cursor_pool',     # list of released cursors to be reused by acquire_cursor()
+        '_hit_log',         # deque of (region, regions, offset, size) of hits recorded without holding our lock
+        '__weakref__'
     ]
 
     #{ Configuration
@@ -260,11 +839,15 @@ class StaticWindowMapManager:
     MapWindowCls = MapWindow
     MapRegionCls = MapRegion
     WindowCursorCls = WindowCursor
+    max_pooled_cursors = 256    # maximum amount of released cursors to keep for reuse by acquire_cursor()
+    max_logged_hits = 256       # amount of hits recorded without our lock before they are passed to the policy
     #} END configuration
 
     _MB_in_bytes = 1024 * 1024
 
-    def __init__(self, window_size=0, max_memory_size=0, max_open_handles=sys.maxsize):
+    def __init__(self, window_size=0, max_memory_size=0, max_open_handles=sys.maxsize, policy=None,
+                 thread_safe=False, track_growth=False, max_dirty_size=0, huge_pages=False, prefault=False,
+                 auto_limits=False, limits_refresh_interval=0):
         """initialize the manager with the given parameters.
         :param window_size: if -1, a default window size will be chosen depending on
             the operating system's architecture. It will internally be quantified to a multiple of the page size
@@ -274,13 +857,60 @@ class StaticWindowMapManager:
             It is a soft limit that is tried to be kept, but nothing bad happens if we have to over-allocate
         :param max_open_handles: if not maxint, limit the amount of open file handles to the given number.
             Otherwise the amount is only limited by the system itself. If a system or soft limit is hit,
-            the manager will free as many handles as possible"""
+            the manager will free as many handles as possible
+        :param policy: an EvictionPolicy instance deciding which unused region to unmap if resources
+            are needed. If None, the least recently used region will be unmapped.
+            Each manager requires its own policy instance
+        :param thread_safe: if True, the manager may be shared by cursors used in different threads.
+            A cursor itself may only be used by one thread at a time. Cursors moving to regions which
+            are mapped already, and releasing them, don't need to take the manager's lock
+        :param track_growth: if True, the size of a file is checked again once a cursor tries to access it
+            beyond its known end, allowing to read data appended to the file in the meanwhile.
+            Otherwise, a file's size is determined only once
+        :param max_dirty_size: amount of bytes which may be written to files mapped with ACCESS_WRITE
+            before all changes are flushed to the files at once. If 0, a quarter of max_memory_size is used
+        :param huge_pages: if True, window offsets and sizes are aligned to HUGE_PAGE_SIZE, and the kernel
+            is asked to back windows with transparent huge pages, reducing TLB misses when accessing them.
+            This has no effect if the kernel or file system doesn't support it
+        :param prefault: if True, all pages of a window are read when mapping it, using MAP_POPULATE
+            if available, so that accessing the window doesn't cause page faults
+        :param auto_limits: if True, limits which are not given explicitly are derived from the limits of the
+            process, which is half of the memory limit of its cgroup or the system's memory, and half of
+            its RLIMIT_NOFILE. This keeps the manager from exceeding the limits of containers
+        :param limits_refresh_interval: if not 0, the limits derived from the system are determined again
+            once the given amount of seconds passed, when a region is obtained the next time. This adapts
+            the manager to resized containers. A smaller memory limit takes effect once the next window is mapped"""
         self._fdict = dict()
         self._window_size = window_size
         self._max_memory_size = max_memory_size
         self._max_handle_count = max_open_handles
         self._memory_size = 0
         self._handle_count = 0
+        self._policy = policy if policy is not None else LRUPolicy()
+        self._lock = RLock() if thread_safe else nullcontext()
+        self._prefetcher = None
+        self._track_growth = track_growth
+        self._fd_pool = OrderedDict()
+        self._max_pooled_fds = 0
+        self._dirty = OrderedDict()
+        self._dirty_size = 0
+        self._max_dirty_size = max_dirty_size
+        self._huge_pages = huge_pages
+        self._prefault = prefault
+        self._num_open_files = 0
+        self._num_hits = 0
+        self._num_maps = 0
+        self._num_evictions = 0
+        self._num_collections = 0
+        self._num_map_retries = 0
+        self._peak_memory_size = 0
+        self._tracer = None
+        self._window_bounds = None
+        self._auto_limits = None
+        self._limits_interval = limits_refresh_interval
+        self._limits_deadline = None
+        self._cursor_pool = list()
+        self._hit_log = deque()
 
         if window_size < 0:
             coeff = 64
@@ -289,19 +919,103 @@ class StaticWindowMapManager:
             # END handle arch
             self._window_size = coeff * self._MB_in_bytes
         # END handle max window size
+        if huge_pages:
+            self._window_size = align_to_mmap(self._window_size, True, HUGE_PAGE_SIZE)
+        # END handle huge page windows
 
         if max_memory_size == 0:
-            coeff = 1024
-            if is_64_bit():
-                coeff = 8192
-            # END handle arch
-            self._max_memory_size = coeff * self._MB_in_bytes
+            self._max_memory_size = self._default_max_memory_size()
         # END handle max memory size
 
+        if auto_limits:
+            self._auto_limits = (max_memory_size == 0, max_open_handles == sys.maxsize, max_dirty_size == 0)
+            self._apply_limits()
+        # END handle limits of the system
+
+        if max_dirty_size == 0:
+            self._max_dirty_size = self._max_memory_size // 4
+        # END handle max dirty size
+
+    @classmethod
+    def _default_max_memory_size(cls):
+        """:return: the maximum amount of memory to map if the user didn't specify it"""
+        coeff = 1024
+        if is_64_bit():
+            coeff = 8192
+        # END handle arch
+        return coeff * cls._MB_in_bytes
+
     #{ Internal Methods
 
+    def _acquire_region(self, region):
+        """Add a client to the given region. It will not be collected until all clients released it again"""
+        region.increment_client_count()
+        self._policy.acquire(region)
+
+    def _release_region(self, region, regions):
+        """Remove a client from the given region. If only the manager holds it afterwards, it may be collected
+        :param regions: the regions list the region belongs to"""
+        region.increment_client_count(-1)
+        if region._uc == 1:
+            if not region._detached:
+                self._policy.release(region, regions)
+            elif not region._pins:
+                self._release_unused(region, regions)
+            # END handle detached region
+        # END handle unused region
+
+    def _claim_region(self, region):
+        """Prepare unmapping the given region, which is not used by clients acquiring it with our lock held.
+        Cursors pin regions without our lock, and back off once they see the region detached after pinning it.
+        As we detach it before checking its pins, either we see their pin, or they see it detached.
+        :return: True if the region may be unmapped. Otherwise it stays detached until its last pin is removed"""
+        region._detached = True
+        return not region._pins
+
+    def _unpin_region(self, region, regions):
+        """Remove a cursor's pin from the given region, which doesn't require our lock unless the region
+        was detached while being pinned, and has to be made known to the eviction policy again"""
+        pins = region._pins
+        pins.pop()
+        if region._detached and not pins:
+            with self._lock:
+                if region._detached and region._uc == 1 and not pins:
+                    self._release_unused(region, regions)
+                # END handle unused region
+        # END handle detached region
+
+    def _replay_hits(self):
+        """Pass the hits recorded by cursors without holding our lock to the eviction policy and our counters"""
+        log = self._hit_log
+        policy = self._policy
+        for _ in range(len(log)):
+            region, regions, offset, size = log.popleft()
+            self._num_hits += 1
+            regions._num_hits += 1
+            if region._uc == 1 and not region._detached:
+                policy.touch(region, regions)
+            # END handle region known to the policy
+            pattern = regions._pattern
+            if pattern is not None and pattern.record(offset, size, region, True):
+                pattern.adjust(*self._window_bounds)
+            # END adapt window size
+        # END for each hit
+
+    def _add_region(self, regions, region):
+        """Account for a newly mapped region and make it known to the collector. The region is
+        not yet used by any cursor"""
+        self._handle_count += 1
+        self._memory_size += region.size()
+        self._peak_memory_size = max(self._peak_memory_size, self._memory_size)
+        self._num_maps += 1
+        regions._num_maps += 1
+        if len(regions) == 1:
+            self._num_open_files += 1
+        # END handle newly opened file
+        self._policy.insert(region, regions)
+
     def _collect_lru_region(self, size):
-        """Unmap the region which was least-recently used and has no client
+        """Unmap the region which has no client and was selected by our eviction policy
         :param size: size of the region we want to map next (assuming its not already mapped partially or full
             if 0, we try to free any available region
         :return: Amount of freed regions
@@ -310,53 +1024,342 @@ class StaticWindowMapManager:
             We don't raise exceptions anymore, in order to keep the system working, allowing temporary overallocation.
             If the system runs out of memory, it will tell.
 
-        .. TODO::
-            implement a case where all unusued regions are discarded efficiently.
-            Currently its only brute force
+        .. Note::
+            Unused regions are indexed by the eviction policy, hence finding the next region to collect
+            doesn't depend on the amount of mapped regions.
         """
         num_found = 0
+        policy = self._policy
+        self._num_collections += 1
         while (size == 0) or (self._memory_size + size > self._max_memory_size):
-            lru_region = None
-            lru_list = None
-            for regions in self._fdict.values():
-                for region in regions:
-                    # check client count - if it's 1, it's just us
-                    if (region.client_count() == 1 and
-                            (lru_region is None or region._uc < lru_region._uc)):
-                        lru_region = region
-                        lru_list = regions
-                    # END update lru_region
-                # END for each region
-            # END for each regions list
-
-            if lru_region is None:
+            item = policy.evict()
+            if item is None:
                 break
-            # END handle region not found
-
+            # END handle no collectable region
+            if not self._claim_region(item[0]):
+                # a cursor is using it
+                continue
+            # END handle pinned region
             num_found += 1
-            del(lru_list[lru_list.index(lru_region)])
-            lru_region.increment_client_count(-1)
-            self._memory_size -= lru_region.size()
-            self._handle_count -= 1
+            self._num_evictions += 1
+            item[1]._num_evictions += 1
+            self._unmap_region(*item)
         # END while there is more memory to free
         return num_found
 
+    def _unmap_region(self, region, regions):
+        """Remove the given unused region from its regions list and unmap it. The eviction policy
+        must not know the region anymore, and it must have been claimed using _claim_region()"""
+        regions.remove_region(region)
+        self._release_mapping(region, regions)
+        if not regions:
+            self._num_open_files -= 1
+            self._close_fd(regions)
+        # END close file once it isn't mapped anymore
+
+    def _release_mapping(self, region, regions):
+        """Unmap the given region, which is not part of its regions list anymore, and account for it"""
+        tracer = self._tracer
+        probe = Probe() if tracer is not None else None
+        if region._dirty is not None:
+            self._flush_region(region)
+        # END write changes
+        # let the system drop the pages right away
+        region.advise(MADV_DONTNEED)
+        region.increment_client_count(-1)
+        if tracer is not None:
+            tracer.unmapped(region, regions, *probe.stop())
+        # END handle tracing
+        self._memory_size -= region.size()
+        self._handle_count -= 1
+
+    def _replace_region(self, region, regions):
+        """Remove the given region, which ends at the former end of its grown file, from its regions list.
+        Mappings have to start at aligned offsets, hence a region mapping the appended data would overlap it.
+        If the region is in use, it stays mapped until its last client released it, see _release_unused()"""
+        if region._uc == 1 and self._claim_region(region):
+            self._policy.discard(region)
+            self._unmap_region(region, regions)
+            return
+        # END handle unused region
+        region._detached = True
+        self._policy.discard(region)
+        regions.remove_region(region)
+        if not regions:
+            self._num_open_files -= 1
+        # END handle last region
+
+    def _release_unused(self, region, regions):
+        """Called with our lock held once the given detached region is not used by any client anymore.
+        Makes it known to the eviction policy again, or unmaps it if it was replaced while it was in use"""
+        region._detached = False
+        if regions.find_region(region._b) is region:
+            self._policy.release(region, regions)
+        else:
+            self._release_mapping(region, regions)
+        # END handle replaced region
+
+    def _mark_dirty(self, region, regions, ofs, size):
+        """Record that the given range of the given region was written to. Flushes all dirty regions
+        once there are more than max_dirty_size dirty bytes
+        :param ofs: offset relative to the region's beginning"""
+        grown = region.mark_dirty(ofs, size)
+        if not grown:
+            return
+        # END handle no change
+        self._dirty[region] = regions
+        self._dirty_size += grown
+        if self._dirty_size > self._max_dirty_size:
+            self._flush_dirty()
+        # END flush batch
+
+    def _flush_region(self, region):
+        """Write the changes of the given dirty region to its file"""
+        del self._dirty[region]
+        self._dirty_size -= region.flush()
+
+    def _flush_dirty(self, regions=None):
+        """Write the changes of all dirty regions, or of the ones of the given regions list only, to their files
+        :return: amount of flushed regions"""
+        if regions is None:
+            dirty = list(self._dirty)
+        else:
+            dirty = [r for r, rlist in self._dirty.items() if rlist is regions]
+        # END select regions
+        for region in dirty:
+            self._flush_region(region)
+        # END for each dirty region
+        return len(dirty)
+
+    def _fdict_key(self, path_or_fd, access):
+        """:return: key of the regions list of the given file mapped with the given access mode.
+            Read-only files are keyed by their path or file descriptor"""
+        if access == ACCESS_READ:
+            return path_or_fd
+        return (path_or_fd, access)
+
+    def _map_region(self, regions, path_or_fd, ofs, size, flags):
+        """:return: a new region mapping the given part of the file of the given regions list
+        :param path_or_fd: the path or open file descriptor of the file to map"""
+        tracer = self._tracer
+        if tracer is None:
+            return self.MapRegionCls(path_or_fd, ofs, size, flags, regions.file_size(), regions._access,
+                                     self._huge_pages, self._prefault)
+        # END handle no tracing
+        probe = Probe()
+        region = self.MapRegionCls(path_or_fd, ofs, size, flags, regions.file_size(), regions._access,
+                                   self._huge_pages, self._prefault)
+        tracer.mapped(region, regions, *probe.stop())
+        return region
+
+    def _apply_limits(self):
+        """Derive the limits which were not given explicitly from the limits of the process"""
+        auto_memory, auto_handles, auto_dirty = self._auto_limits
+        max_memory_size, max_open_handles = limits.auto_limits(self._default_max_memory_size())
+        if auto_memory:
+            self._max_memory_size = max_memory_size
+        # END handle memory
+        if auto_handles:
+            self._max_handle_count = max_open_handles
+        # END handle handles
+        if auto_dirty:
+            self._max_dirty_size = self._max_memory_size // 4
+        # END handle dirty memory
+        if self._limits_interval:
+            self._limits_deadline = monotonic() + self._limits_interval
+        # END schedule refresh
+
+    def _check_limits(self):
+        """Determine the limits derived from the system again if it is time to do so"""
+        if self._limits_deadline is not None and monotonic() >= self._limits_deadline:
+            self._apply_limits()
+        # END handle refresh
+
+    def _regions_for(self, path_or_fd, access):
+        """:return: the regions list of the given file mapped with the given access mode, created if needed"""
+        key = self._fdict_key(path_or_fd, access)
+        regions = self._fdict.get(key)
+        if regions is None:
+            regions = self.MapRegionListCls(path_or_fd, access)
+            if self._window_bounds is not None:
+                min_size, max_size = self._window_bounds
+                regions._pattern = AccessPattern(max(min(self._window_size, max_size), min_size))
+            # END handle adaptive windows
+            self._fdict[key] = regions
+        # END obtain region for path
+        return regions
+
+    def _forget_file(self, regions):
+        """Free all resources associated with the file of the given regions list if none of its regions
+        is mapped anymore, which may be checked without holding our lock beforehand"""
+        with self._lock:
+            if not regions:
+                self._close_fd(regions)
+                self._fdict.pop(self._fdict_key(regions.path_or_fd(), regions.access()), None)
+            # END forget file
+
+    def _return_cursor(self, cursor):
+        """Keep the given released cursor to be reused by acquire_cursor()"""
+        cursor._rlist = None
+        if cursor._state is not None:
+            cursor._state[0] = None
+            cursor._state[1] = None
+        # END don't keep the file and us alive through the finalizer
+        # the pool may exceed its size slightly if cursors are returned concurrently, which is harmless
+        pool = self._cursor_pool
+        if len(pool) < self.max_pooled_cursors:
+            pool.append(cursor)
+        # END handle pool size
+
+    def _window_size_of(self, regions):
+        """:return: size of the windows to map for the file of the given regions list"""
+        if regions._pattern is not None:
+            return regions._pattern._window_size
+        return self._window_size
+
+    def _coalesce_regions(self, regions, pos=None):
+        """Replace each run of adjacent unused regions of the given list by a single region, as long as it
+        doesn't exceed the file's window size. Regions used by cursors are never replaced
+        :param pos: if not None, only the runs ending right before and starting at this index of the list
+            are considered, which doesn't require looking at all regions of the file
+        :return: amount of regions which were saved"""
+        if regions._access == ACCESS_COPY:
+            # the private changes of a region would be lost
+            return 0
+        # END handle copy on write
+        max_size = self._window_size_of(regions) or sys.maxsize
+        num_saved = 0
+        i = 0
+        stop = len(regions)
+        if pos is not None:
+            # find the first region of the run ending right before the position
+            i = pos
+            while (i > 0 and regions[i - 1]._uc == 1 and not regions[i - 1]._pins and
+                   (i == pos or regions[i]._b == regions[i - 1].ofs_end()) and
+                   regions[pos - 1].ofs_end() - regions[i - 1]._b <= max_size):
+                i -= 1
+            # END while the run can be extended to the left
+            stop = pos + 1
+        # END handle position
+        while i < min(stop, len(regions)):
+            first = regions[i]
+            j = i + 1
+            if first._uc == 1 and not first._pins:
+                while (j < len(regions) and regions[j]._uc == 1 and not regions[j]._pins and
+                       regions[j]._b == regions[j - 1].ofs_end() and regions[j].ofs_end() - first._b <= max_size):
+                    j += 1
+                # END while the run can be extended
+            # END handle unused region
+            if j - i < 2:
+                i = j
+                continue
+            # END handle nothing to merge
+
+            run = regions[i:j]
+            if not all([self._claim_region(old) for old in run]):
+                # a cursor started using one of them in the meanwhile, they stay known to the policy
+                for old in run:
+                    old._detached = False
+                # END for each region
+                i = j
+                continue
+            # END handle pinned region
+            # map the new region first, if it fails, we keep the existing ones
+            try:
+                r = self._map_region(regions, self._obtain_fd(regions, 0), first._b, run[-1].ofs_end() - first._b, 0)
+            except Exception:
+                for old in run:
+                    old._detached = False
+                # END for each region
+                return num_saved
+            # END handle mapping failure
+            for old in run:
+                self._policy.discard(old)
+                self._unmap_region(old, regions)
+            # END for each replaced region
+            regions.insert_region(r)
+            self._add_region(regions, r)
+            num_saved += len(run) - 1
+            stop -= len(run) - 1
+            i += 1
+        # END for each region
+        return num_saved
+
+    def _obtain_fd(self, regions, flags):
+        """:return: an open file descriptor for the file of the given regions list, kept in our pool to be used
+            for all windows of the file, or the file's path if file descriptors are not pooled"""
+        path_or_fd = regions.path_or_fd()
+        if isinstance(path_or_fd, int) or not self._max_pooled_fds:
+            return path_or_fd
+        # END handle no pooling
+
+        pool = self._fd_pool
+        if regions._fd is not None:
+            pool.move_to_end(id(regions))
+            return regions._fd
+        # END handle pooled descriptor
+
+        while len(pool) >= self._max_pooled_fds:
+            self._close_fd(next(iter(pool.values())))
+        # END make room
+        mode = os.O_RDWR if regions._access == ACCESS_WRITE else os.O_RDONLY
+        regions._fd = os.open(path_or_fd, mode | getattr(os, 'O_BINARY', 0) | flags)
+        pool[id(regions)] = regions
+        return regions._fd
+
+    def _close_fd(self, regions):
+        """Close the pooled file descriptor of the given regions list, if there is one"""
+        if regions._fd is None:
+            return
+        # END early bailout
+        os.close(regions._fd)
+        regions._fd = None
+        del self._fd_pool[id(regions)]
+
+    def _refresh_file_size(self, regions):
+        """Update the cached size of the file of the given regions list. If the file grew, an unused region
+        ending at the previous end of the file is unmapped, so that a larger one can take its place
+        :return: the new file size"""
+        old_size = regions._file_size
+        fsize = regions.refresh_file_size()
+        if old_size is not None and fsize > old_size and regions:
+            last = regions[-1]
+            if last.ofs_end() == old_size and last._uc == 1:
+                if self._claim_region(last):
+                    self._policy.discard(last)
+                    self._unmap_region(last, regions)
+                else:
+                    last._detached = False
+                # END handle pinned region
+            # END handle last region
+        # END handle growth
+        return fsize
+
     def _obtain_region(self, a, offset, size, flags, is_recursive):
         """Utility to create a new region - for more information on the parameters,
         see MapCursor.use_region.
         :param a: A regions (a)rray
         :return: The newly created region"""
+        self._check_limits()
         if self._memory_size + size > self._max_memory_size:
             self._collect_lru_region(size)
         # END handle collection
 
-        r = None
-        if a:
-            assert len(a) == 1
-            r = a[0]
-        else:
+        r = a.find_region(offset)
+        if r is None:
+            ofs = 0
+            if a:
+                # the file grew while its former end is still in use - map the remainder
+                ofs = align_to_mmap(a[-1].ofs_end(), False)
+                if ofs < a[-1].ofs_end():
+                    # regions must not overlap, the remainder replaces the former end
+                    self._replace_region(a[-1], a)
+                    ofs = align_to_mmap(a[-1].ofs_end(), False) if a else 0
+                # END handle unaligned end
+            # END handle existing region
+            fsize = a.file_size()
             try:
-                r = self.MapRegionCls(a.path_or_fd(), 0, sys.maxsize, flags)
+                r = self._map_region(a, a.path_or_fd(), ofs, fsize - ofs, flags)
             except Exception:
                 # apparently we are out of system resources or hit a limit
                 # As many more operations are likely to fail in that condition (
@@ -367,13 +1370,16 @@ class StaticWindowMapManager:
                     # a mapping. This is an exception, so we propagate it
                     raise
                 # END handle existing recursion
+                self._num_map_retries += 1
                 self._collect_lru_region(0)
                 return self._obtain_region(a, offset, size, flags, True)
             # END handle exceptions
 
-            self._handle_count += 1
-            self._memory_size += r.size()
-            a.append(r)
+            a.insert_region(r)
+            self._add_region(a, r)
+        else:
+            self._num_hits += 1
+            a._num_hits += 1
         # END handle array
 
         assert r.includes_ofs(offset)
@@ -382,10 +1388,16 @@ class StaticWindowMapManager:
     #}END internal methods
 
     #{ Interface
-    def make_cursor(self, path_or_fd):
+    def make_cursor(self, path_or_fd, advice=None, access=ACCESS_READ):
         """
         :return: a cursor pointing to the given path or file descriptor.
             It can be used to map new regions of the file into memory
+        :param advice: one of the MADV_* constants, hinting the kernel how the regions used by the cursor
+            will be accessed, like MADV_SEQUENTIAL or MADV_RANDOM. It is ignored if not supported by the platform.
+        :param access: ACCESS_READ to map the file read-only, ACCESS_WRITE to write changes back to the file,
+            or ACCESS_COPY to allow changes which are not written to the file. Cursors using different
+            access modes for the same file use separate regions. With ACCESS_COPY, changes are private to
+            a region and lost once it is unmapped, which only happens while no cursor uses it.
 
         **Note:** if a file descriptor is given, it is assumed to be open and valid,
         but may be closed afterwards. To refer to the same file, you may reuse
@@ -398,25 +1410,98 @@ class StaticWindowMapManager:
 
         **Note:** Using file descriptors directly is faster once new windows are mapped as it
         prevents the file to be opened again just for the purpose of mapping it."""
-        regions = self._fdict.get(path_or_fd)
+        with self._lock:
+            regions = self._regions_for(path_or_fd, access)
+        return self.WindowCursorCls(self, regions, advice)
+
+    def acquire_cursor(self, path_or_fd, advice=None, access=ACCESS_READ):
+        """Like make_cursor(), but reuses a cursor which was released before if possible, which is cheaper
+        than creating a new one. The cursor must be released using its release() method or by using it in
+        a with block, and must not be used afterwards.
+
+        :return: a cursor pointing to the given path or file descriptor"""
+        # known files and pooled cursors are obtained without our lock, as list.pop() is atomic
+        regions = self._fdict.get(self._fdict_key(path_or_fd, access))
         if regions is None:
-            regions = self.MapRegionListCls(path_or_fd)
-            self._fdict[path_or_fd] = regions
-        # END obtain region for path
-        return self.WindowCursorCls(self, regions)
+            with self._lock:
+                regions = self._regions_for(path_or_fd, access)
+            # END with lock
+        # END handle new file
+        try:
+            cursor = self._cursor_pool.pop()
+        except IndexError:
+            pass
+        else:
+            cursor._rlist = regions
+            cursor._advice = advice
+            return cursor
+        # END reuse cursor
+        cursor = self.WindowCursorCls(self, regions, advice)
+        cursor._pooled = True
+        return cursor
 
     def collect(self):
         """Collect all available free-to-collect mapped regions
         :return: Amount of freed handles"""
-        return self._collect_lru_region(0)
+        with self._lock:
+            self._replay_hits()
+            return self._collect_lru_region(0)
+
+    def compact(self):
+        """Replace runs of adjacent mapped regions which are not used by any cursor with one larger region each,
+        as long as it is not larger than the window size. This reduces the amount of handles in use and
+        regions to consider for eviction, without unmapping any data. Files mapped with ACCESS_COPY are skipped
+        :return: Amount of freed handles"""
+        with self._lock:
+            return sum(self._coalesce_regions(rlist) for rlist in list(self._fdict.values()))
+
+    def flush(self):
+        """Write the changes of all regions mapped with ACCESS_WRITE to their files
+        :return: amount of regions which were written"""
+        with self._lock:
+            return self._flush_dirty()
 
     def num_file_handles(self):
         """:return: amount of file handles in use. Each mapped region uses one file handle"""
         return self._handle_count
 
+    def num_pooled_file_handles(self):
+        """:return: amount of file descriptors kept open to map additional windows of files.
+            They count against max_file_handles() in addition to num_file_handles()"""
+        return len(self._fd_pool)
+
     def num_open_files(self):
         """Amount of opened files in the system"""
-        return reduce(lambda x, y: x + y, (1 for rlist in self._fdict.values() if len(rlist) > 0), 0)
+        return self._num_open_files
+
+    def stats(self, per_file=False):
+        """:return: dict with a snapshot of counters describing how well our limits serve our cursors, with keys
+
+            * hits: amount of times a cursor moved to a region which was mapped already
+            * maps: amount of regions mapped so far
+            * evictions: amount of unused regions which were unmapped to free resources
+            * collections: amount of times unused regions were collected due to limits or a call to collect()
+            * map_retries: amount of times mapping a region failed, and was retried after collecting all unused regions
+            * mapped_memory_size, peak_mapped_memory_size: amount of currently mapped bytes, and its maximum so far
+            * dirty_memory_size: amount of bytes written which were not flushed yet
+            * file_handles, pooled_file_handles, open_files: see the respective num_* methods
+            * files: only if per_file is True, a dict of path_or_fd -> dict with the hits, maps and evictions
+              of the file's regions, and the amount of its currently mapped regions and bytes. Files mapped
+              using another access mode than ACCESS_READ are keyed by tuple(path_or_fd, access)
+
+        **Note:** counters are updated as things happen, only the per-file breakdown has to visit all mapped regions.
+        Reusing a cursor's current region is not counted as a hit"""
+        with self._lock:
+            self._replay_hits()
+            stats = dict(hits=self._num_hits, maps=self._num_maps, evictions=self._num_evictions,
+                         collections=self._num_collections, map_retries=self._num_map_retries,
+                         mapped_memory_size=self._memory_size, peak_mapped_memory_size=self._peak_memory_size,
+                         dirty_memory_size=self._dirty_size, file_handles=self._handle_count,
+                         pooled_file_handles=len(self._fd_pool), open_files=self._num_open_files)
+            if per_file:
+                stats['files'] = {key: rlist.stats() for key, rlist in self._fdict.items()}
+            # END handle per file stats
+        return stats
 
     def window_size(self):
         """:return: size of each window when allocating new regions"""
@@ -434,6 +1519,58 @@ class StaticWindowMapManager:
         """:return: maximum amount of memory we may allocate"""
         return self._max_memory_size
 
+    def dirty_memory_size(self):
+        """:return: amount of bytes written to mapped regions which were not yet flushed to their files"""
+        return self._dirty_size
+
+    def max_dirty_memory_size(self):
+        """:return: amount of dirty bytes at which all changes are flushed to their files"""
+        return self._max_dirty_size
+
+    def is_thread_safe(self):
+        """:return: True if cursors of this manager may be used concurrently by multiple threads"""
+        return not isinstance(self._lock, nullcontext)
+
+    def refresh_limits(self):
+        """Determine the limits which are derived from the limits of the process again, see auto_limits in __init__.
+        A smaller memory limit takes effect once the next window is mapped
+        :return: tuple(max_mapped_memory_size, max_file_handles) after the refresh"""
+        with self._lock:
+            if self._auto_limits is not None:
+                self._apply_limits()
+            # END handle limits of the system
+            return self._max_memory_size, self._max_handle_count
+
+    def uses_huge_pages(self):
+        """:return: True if windows are aligned to and backed by huge pages if possible"""
+        return self._huge_pages
+
+    def prefaults(self):
+        """:return: True if all pages of a window are read when mapping it"""
+        return self._prefault
+
+    def prefetcher(self):
+        """:return: the WindowPrefetcher mapping windows ahead of sequential readers, or None"""
+        return self._prefetcher
+
+    def policy(self):
+        """:return: the eviction policy deciding which unused region to unmap next"""
+        return self._policy
+
+    def set_tracer(self, tracer):
+        """Inform the given Tracer about each region we map and unmap, and about each read of a cursor,
+        including the time it took and the page faults it caused. If None, tracing is disabled, which is
+        the default and has no measurable overhead.
+        :return: the previous tracer, or None"""
+        with self._lock:
+            prev = self._tracer
+            self._tracer = tracer
+        return prev
+
+    def tracer(self):
+        """:return: our Tracer, or None if tracing is disabled"""
+        return self._tracer
+
     #} END interface
 
     #{ Special Purpose Interface
@@ -456,13 +1593,18 @@ class StaticWindowMapManager:
         # END early bailout
 
         num_closed = 0
-        for path, rlist in self._fdict.items():
-            if path.startswith(base_path):
-                for region in rlist:
-                    region.release()
-                    num_closed += 1
-            # END path matches
-        # END for each path
+        with self._lock:
+            for rlist in self._fdict.values():
+                path = rlist.path_or_fd()
+                if isinstance(path, str) and path.startswith(base_path):
+                    self._flush_dirty(rlist)
+                    self._close_fd(rlist)
+                    for region in rlist:
+                        region._detached = True
+                        region.release()
+                        num_closed += 1
+                # END path matches
+            # END for each path
         return num_closed
     #} END special purpose interface
 
@@ -475,7 +1617,9 @@ class SlidingWindowMapManager(StaticWindowMapManager):
     which result from each mmap call, the least recently used, and currently unused mapped regions
     are unloaded automatically.
 
-    **Note:** currently not thread-safe !
+    **Note:** only thread-safe if created with thread_safe=True. In that case, the manager's state is
+        protected by a lock, which is only required to map new regions. Cursors using regions which are mapped
+        already don't take it, and record their hits to be passed to the eviction policy later.
 
     **Note:** in the current implementation, we will automatically unload windows if we either cannot
         create more memory maps (as the open file handles limit is hit) or if we have allocated more than
@@ -484,32 +1628,55 @@ class SlidingWindowMapManager(StaticWindowMapManager):
 
     __slots__ = tuple()
 
-    def __init__(self, window_size=-1, max_memory_size=0, max_open_handles=sys.maxsize):
-        """Adjusts the default window size to -1"""
-        super().__init__(window_size, max_memory_size, max_open_handles)
+    #{ Configuration
+    WindowPrefetcherCls = WindowPrefetcher
+    #} END configuration
+
+    def __init__(self, window_size=-1, max_memory_size=0, max_open_handles=sys.maxsize, policy=None,
+                 thread_safe=False, prefetch=False, track_growth=False, max_pooled_fds=0, max_dirty_size=0,
+                 huge_pages=False, prefault=False, window_size_bounds=None, auto_limits=False,
+                 limits_refresh_interval=0):
+        """Adjusts the default window size to -1
+        :param prefetch: if True, once a cursor moves on to the next window, the window following it
+            will be mapped in a background thread. This makes the manager thread-safe
+        :param max_pooled_fds: maximum amount of files mapped by path to keep open while they have mapped
+            windows, which saves opening the file for each window. These count as open handles, and are closed
+            at the latest once the manager is collected. If 0, the default, files are not kept open.
+            If None, a quarter of max_open_handles is used, but not more than 32
+        :param window_size_bounds: if not None, tuple(min, max) of window sizes. The window size of each file
+            then starts at window_size and is adapted to the way the file is accessed. It grows for files read
+            sequentially or by reads spanning windows, and shrinks for files accessed at random offsets"""
+        super().__init__(window_size, max_memory_size, max_open_handles, policy, thread_safe or prefetch,
+                         track_growth, max_dirty_size, huge_pages, prefault, auto_limits, limits_refresh_interval)
+        if max_pooled_fds is None:
+            max_pooled_fds = min(32, self._max_handle_count // 4)
+        # END handle default pool size
+        self._max_pooled_fds = max_pooled_fds
+        if max_pooled_fds:
+            # regions lists don't close their file descriptor, and may outlive us
+            weakref.finalize(self, _close_pooled_fds, self._fd_pool).atexit = False
+        # END close pooled files with us
+        if window_size_bounds is not None:
+            alignment = HUGE_PAGE_SIZE if huge_pages else ALLOCATIONGRANULARITY
+            min_size, max_size = window_size_bounds
+            min_size = align_to_mmap(max(min_size, 1), True, alignment)
+            self._window_bounds = (min_size, max(align_to_mmap(max_size, True, alignment), min_size))
+        # END handle adaptive windows
+        if prefetch:
+            self._prefetcher = self.WindowPrefetcherCls(self)
+        # END handle prefetching
 
     def _obtain_region(self, a, offset, size, flags, is_recursive):
         # bisect to find an existing region. The c++ implementation cannot
         # do that as it uses a linked list for regions.
-        r = None
-        lo = 0
-        hi = len(a)
-        while lo < hi:
-            mid = (lo + hi) // 2
-            ofs = a[mid]._b
-            if ofs <= offset:
-                if a[mid].includes_ofs(offset):
-                    r = a[mid]
-                    break
-                # END have region
-                lo = mid + 1
-            else:
-                hi = mid
-            # END handle position
-        # END while bisecting
-
+        r = a.find_region(offset)
+        is_hit = r is not None
         if r is None:
-            window_size = self._window_size
+            # merge unused regions next to the new one to free handles before unmapping anything
+            if self._handle_count + len(self._fd_pool) >= self._max_handle_count:
+                self._coalesce_regions(a, a.insert_position(offset))
+            # END handle handle limit
+            window_size = self._window_size_of(a)
             left = self.MapWindowCls(0, 0)
             mid = self.MapWindowCls(offset, size)
             right = self.MapWindowCls(a.file_size(), 0)
@@ -517,27 +1684,14 @@ class SlidingWindowMapManager(StaticWindowMapManager):
             # we want to honor the max memory size, and assure we have anough
             # memory available
             # Save calls !
+            self._check_limits()
             if self._memory_size + window_size > self._max_memory_size:
                 self._collect_lru_region(window_size)
             # END handle collection
 
-            # we assume the list remains sorted by offset
-            insert_pos = 0
+            # the list remains sorted by offset
+            insert_pos = a.insert_position(offset)
             len_regions = len(a)
-            if len_regions == 1:
-                if a[0]._b <= offset:
-                    insert_pos = 1
-                # END maintain sort
-            else:
-                # find insert position
-                insert_pos = len_regions
-                for i, region in enumerate(a):
-                    if region._b > offset:
-                        insert_pos = i
-                        break
-                    # END if insert position is correct
-                # END for each region
-            # END obtain insert pos
 
             # adjust the actual offset and size values to create the largest
             # possible mapping
@@ -554,19 +1708,25 @@ class SlidingWindowMapManager(StaticWindowMapManager):
 
             mid.extend_left_to(left, window_size)
             mid.extend_right_to(right, window_size)
-            mid.align()
+            mid.align(HUGE_PAGE_SIZE if self._huge_pages else ALLOCATIONGRANULARITY)
 
             # it can happen that we align beyond the end of the file
             if mid.ofs_end() > right.ofs:
                 mid.size = right.ofs - mid.ofs
             # END readjust size
 
+            # the left region may end at the former end of the file, which isn't aligned. As regions must
+            # not overlap, the new region replaces it
+            if insert_pos and mid.ofs < left.ofs_end():
+                self._replace_region(a[insert_pos - 1], a)
+            # END handle unaligned end
+
             # insert new region at the right offset to keep the order
             try:
-                if self._handle_count >= self._max_handle_count:
+                if self._handle_count + len(self._fd_pool) >= self._max_handle_count:
                     raise Exception
                 # END assert own imposed max file handles
-                r = self.MapRegionCls(a.path_or_fd(), mid.ofs, mid.size, flags)
+                r = self._map_region(a, self._obtain_fd(a, flags), mid.ofs, mid.size, flags)
             except Exception:
                 # apparently we are out of system resources or hit a limit
                 # As many more operations are likely to fail in that condition (
@@ -577,12 +1737,235 @@ class SlidingWindowMapManager(StaticWindowMapManager):
                     # a mapping. This is an exception, so we propagate it
                     raise
                 # END handle existing recursion
+                self._num_map_retries += 1
                 self._collect_lru_region(0)
                 return self._obtain_region(a, offset, size, flags, True)
             # END handle exceptions
 
-            self._handle_count += 1
-            self._memory_size += r.size()
-            a.insert(insert_pos, r)
+            a.insert_region(r)
+            self._add_region(a, r)
+        else:
+            self._num_hits += 1
+            a._num_hits += 1
         # END create new region
+
+        pattern = a._pattern
+        if pattern is not None and pattern.record(offset, size, r, is_hit):
+            pattern.adjust(*self._window_bounds)
+        # END adapt window size
         return r
+
+
+class _WindowMapShard(SlidingWindowMapManager):
+
+    """A thread-safe sliding window manager which obtains additional resources from the
+    ShardedWindowMapManager owning it once it cannot stay within its own limits"""
+
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner, window_size, max_memory_size, max_open_handles, policy):
+        super().__init__(window_size, max_memory_size, max_open_handles, policy, thread_safe=True)
+        self._owner = owner
+
+    def _collect_lru_region(self, size):
+        num_found = super()._collect_lru_region(size)
+        if (self._memory_size + size > self._max_memory_size or
+                self._handle_count + len(self._fd_pool) >= self._max_handle_count):
+            self._owner._rebalance(self, size)
+        # END handle pressure
+        return num_found
+
+
+class ShardedWindowMapManager:
+
+    """Distributes files among multiple thread-safe sliding window managers, the shards, each of which
+    has its own lock, regions and share of the memory and handle limits.
+    Cursors on files handled by different shards never contend.
+
+    Once a shard cannot stay within its limits even after unmapping all of its unused regions, it takes
+    over the unused part of the limits of other shards. This way, the limits apply to all shards together.
+
+    The interface matches the one of the StaticWindowMapManager, cursors are obtained using make_cursor()"""
+
+    __slots__ = [
+        '_shards',          # list of shard managers
+        '_budget_lock',     # lock protecting the limits of all shards while they are redistributed
+    ]
+
+    #{ Configuration
+    ShardCls = _WindowMapShard
+    #} END configuration
+
+    def __init__(self, num_shards=0, window_size=-1, max_memory_size=0, max_open_handles=sys.maxsize,
+                 policy_type=None, auto_limits=False):
+        """initialize the manager with the given parameters
+        :param num_shards: amount of shards to distribute files to. If 0, there will be one shard per CPU
+        :param policy_type: callable returning a new EvictionPolicy for each shard. If None, shards
+            use their default policy
+        :param auto_limits: if True, limits which are not given explicitly are derived from the limits of the
+            process once, see StaticWindowMapManager.__init__
+        For all other parameters, see StaticWindowMapManager.__init__. The limits are divided
+        equally among all shards"""
+        num_shards = num_shards or os.cpu_count() or 1
+        if auto_limits:
+            auto_memory_size, auto_handles = limits.auto_limits(self.ShardCls._default_max_memory_size())
+            max_memory_size = max_memory_size or auto_memory_size
+            if max_open_handles == sys.maxsize:
+                max_open_handles = auto_handles
+            # END handle handles
+        # END handle limits of the system
+        if max_memory_size == 0:
+            max_memory_size = self.ShardCls._default_max_memory_size()
+        # END handle max memory size
+        shard_memory_size = max(max_memory_size // num_shards, 1)
+        shard_handles = max_open_handles
+        if max_open_handles != sys.maxsize:
+            shard_handles = max(max_open_handles // num_shards, 1)
+        # END handle handles limit
+
+        self._budget_lock = RLock()
+        self._shards = [self.ShardCls(self, window_size, shard_memory_size, shard_handles,
+                                      policy_type and policy_type())
+                        for _ in range(num_shards)]
+
+    def _rebalance(self, shard, size):
+        """Move unused parts of the limits of other shards to the given shard, so that it can map
+        another region of the given size"""
+        with self._budget_lock:
+            need_memory = shard._memory_size + size - shard._max_memory_size
+            need_handles = shard._handle_count + len(shard._fd_pool) + 1 - shard._max_handle_count
+            for other in self._shards:
+                if need_memory <= 0 and need_handles <= 0:
+                    break
+                # END done
+                if other is shard:
+                    continue
+                # END skip recipient
+
+                if need_memory > 0:
+                    take = min(other._max_memory_size - other._memory_size, need_memory)
+                    if take > 0:
+                        other._max_memory_size -= take
+                        shard._max_memory_size += take
+                        need_memory -= take
+                    # END take spare memory
+                # END handle memory
+                if need_handles > 0 and other._max_handle_count != sys.maxsize:
+                    take = min(other._max_handle_count - other._handle_count - len(other._fd_pool) - 1,
+                               need_handles)
+                    if take > 0:
+                        other._max_handle_count -= take
+                        shard._max_handle_count += take
+                        need_handles -= take
+                    # END take spare handles
+                # END handle handles
+            # END for each shard
+
+    #{ Interface
+
+    def shard_for(self, path_or_fd):
+        """:return: the shard manager handling the given path or file descriptor"""
+        return self._shards[hash(path_or_fd) % len(self._shards)]
+
+    def shards(self):
+        """:return: list of all our shard managers"""
+        return self._shards
+
+    def make_cursor(self, path_or_fd, advice=None, access=ACCESS_READ):
+        """:return: a cursor pointing to the given path or file descriptor, obtained from the shard handling it.
+        See StaticWindowMapManager.make_cursor for more information"""
+        return self.shard_for(path_or_fd).make_cursor(path_or_fd, advice, access)
+
+    def acquire_cursor(self, path_or_fd, advice=None, access=ACCESS_READ):
+        """:return: a pooled cursor obtained from the shard handling the given file.
+        See StaticWindowMapManager.acquire_cursor for more information"""
+        return self.shard_for(path_or_fd).acquire_cursor(path_or_fd, advice, access)
+
+    def collect(self):
+        """Collect all available free-to-collect mapped regions in all shards
+        :return: Amount of freed handles"""
+        return sum(shard.collect() for shard in self._shards)
+
+    def compact(self):
+        """Merge adjacent unused regions in all shards, see StaticWindowMapManager.compact
+        :return: Amount of freed handles"""
+        return sum(shard.compact() for shard in self._shards)
+
+    def flush(self):
+        """Write the changes of all regions mapped with ACCESS_WRITE by all shards to their files
+        :return: amount of regions which were written"""
+        return sum(shard.flush() for shard in self._shards)
+
+    def num_file_handles(self):
+        """:return: amount of file handles in use by all shards"""
+        return sum(shard.num_file_handles() for shard in self._shards)
+
+    def num_open_files(self):
+        """Amount of opened files in all shards"""
+        return sum(shard.num_open_files() for shard in self._shards)
+
+    def stats(self, per_file=False):
+        """:return: dict with the sum of the statistics of all shards, see StaticWindowMapManager.stats().
+            peak_mapped_memory_size is the sum of the peaks of all shards"""
+        stats = dict()
+        for shard in self._shards:
+            shard_stats = shard.stats(per_file)
+            files = shard_stats.pop('files', None)
+            for key, value in shard_stats.items():
+                stats[key] = stats.get(key, 0) + value
+            # END for each counter
+            if files is not None:
+                stats.setdefault('files', dict()).update(files)
+            # END handle per file stats
+        # END for each shard
+        return stats
+
+    def window_size(self):
+        """:return: size of each window when allocating new regions"""
+        return self._shards[0].window_size()
+
+    def mapped_memory_size(self):
+        """:return: amount of bytes currently mapped by all shards"""
+        return sum(shard.mapped_memory_size() for shard in self._shards)
+
+    def max_file_handles(self):
+        """:return: maximum amount of handles all shards may have opened"""
+        with self._budget_lock:
+            if any(shard.max_file_handles() == sys.maxsize for shard in self._shards):
+                return sys.maxsize
+            return sum(shard.max_file_handles() for shard in self._shards)
+
+    def max_mapped_memory_size(self):
+        """:return: maximum amount of memory all shards may allocate"""
+        with self._budget_lock:
+            return sum(shard.max_mapped_memory_size() for shard in self._shards)
+
+    def dirty_memory_size(self):
+        """:return: amount of bytes written to regions of all shards which were not yet flushed"""
+        return sum(shard.dirty_memory_size() for shard in self._shards)
+
+    def is_thread_safe(self):
+        """:return: True, cursors may always be used concurrently by multiple threads"""
+        return True
+
+    def set_tracer(self, tracer):
+        """Use the given Tracer in all shards, see StaticWindowMapManager.set_tracer()
+        :return: the previous tracer, or None"""
+        prev = None
+        for shard in self._shards:
+            prev = shard.set_tracer(tracer)
+        # END for each shard
+        return prev
+
+    def tracer(self):
+        """:return: the Tracer used by all shards, or None"""
+        return self._shards[0].tracer()
+
+    def force_map_handle_removal_win(self, base_path):
+        """See StaticWindowMapManager.force_map_handle_removal_win"""
+        if sys.platform != 'win32':
+            return
+        # END early bailout
+        return sum(shard.force_map_handle_removal_win(base_path) for shard in self._shards)
+
+    #} END interface
@@ -0,0 +1,304 @@
+"""Module with policies deciding which of the unused mapped regions is to be unmapped next"""
+from collections import OrderedDict
+from heapq import heappush, heappop, heapify
+
+__all__ = ["EvictionPolicy", "LRUPolicy", "LFUPolicy", "ClockPolicy", "TwoQueuePolicy"]
+
+
+class EvictionPolicy:
+
+    """Base for all policies which are used by the memory managers to select the region to unmap
+    next once resources are needed.
+
+    The manager informs the policy about each region it maps, about each time a client starts using
+    a region and about each time a region is not used by any client anymore. Only regions without
+    clients may be chosen for eviction.
+
+    A policy instance keeps state about the regions of exactly one manager, and must not be shared."""
+    __slots__ = (
+        '_clock',   # logical time, advanced on each region access
+    )
+
+    def __init__(self):
+        self._clock = 0
+
+    #{ Interface
+
+    def insert(self, region, regions):
+        """Called once the given region was newly mapped. It is not yet used by any client
+        :param regions: the MapRegionList the region belongs to"""
+        raise NotImplementedError()
+
+    def acquire(self, region):
+        """Called each time a client starts using the given region. Records the access on the region
+        and prevents the region from being returned by evict().
+
+        **Note:** subclasses must call this base implementation"""
+        self._clock += 1
+        region._hits += 1
+        region._tick = self._clock
+
+    def release(self, region, regions):
+        """Called once the given region is not used by any client anymore, making it a candidate for eviction"""
+        raise NotImplementedError()
+
+    def touch(self, region, regions):
+        """Called for each time a cursor started using the given region without the manager acquiring it.
+        Records the access like acquire() followed by release() would. The region stays a candidate for
+        eviction, the manager checks whether it is still in use before unmapping it"""
+        self.acquire(region)
+        self.release(region, regions)
+
+    def evict(self):
+        """Remove the region which should be unmapped next from our records
+        :return: tuple(region, regions) or None if there is no unused region"""
+        raise NotImplementedError()
+
+    def discard(self, region):
+        """Remove the given unused region from our records, as the manager unmaps it on its own"""
+        raise NotImplementedError()
+
+    def __len__(self):
+        """:return: amount of unused regions which may be evicted"""
+        raise NotImplementedError()
+
+    #} END interface
+
+
+class LRUPolicy(EvictionPolicy):
+
+    """Evicts the region whose last client released it the longest time ago"""
+    __slots__ = (
+        '_lru',     # ordered mapping of unused region -> regions list, least recently used first
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._lru = OrderedDict()
+
+    def insert(self, region, regions):
+        self._lru[region] = regions
+
+    def acquire(self, region):
+        EvictionPolicy.acquire(self, region)
+        self._lru.pop(region, None)
+
+    def release(self, region, regions):
+        self._lru[region] = regions
+
+    def evict(self):
+        if not self._lru:
+            return None
+        return self._lru.popitem(last=False)
+
+    def discard(self, region):
+        self._lru.pop(region, None)
+
+    def __len__(self):
+        return len(self._lru)
+
+
+class LFUPolicy(EvictionPolicy):
+
+    """Evicts the region which was used by the least amount of clients. Ties are resolved by evicting
+    the least recently used region"""
+    __slots__ = (
+        '_heap',        # heap of (hits, tick, seq, region), may contain outdated entries
+        '_entries',     # mapping of unused region -> (regions, seq) of its valid heap entry
+        '_seq',         # sequence number of the last heap entry
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._heap = list()
+        self._entries = dict()
+        self._seq = 0
+
+    def _push(self, region, regions):
+        self._seq += 1
+        self._entries[region] = (regions, self._seq)
+        heappush(self._heap, (region._hits, region._tick, self._seq, region))
+
+        # drop outdated entries once they dominate the heap
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            entries = self._entries
+            self._heap = [e for e in self._heap if entries.get(e[3], (None, None))[1] == e[2]]
+            heapify(self._heap)
+        # END compact heap
+
+    def insert(self, region, regions):
+        self._push(region, regions)
+
+    def acquire(self, region):
+        EvictionPolicy.acquire(self, region)
+        self._entries.pop(region, None)
+
+    def release(self, region, regions):
+        self._push(region, regions)
+
+    def evict(self):
+        heap = self._heap
+        entries = self._entries
+        while heap:
+            hits, tick, seq, region = heappop(heap)
+            entry = entries.get(region)
+            if entry is not None and entry[1] == seq:
+                del entries[region]
+                return region, entry[0]
+            # END handle valid entry
+        # END while there are entries
+        return None
+
+    def discard(self, region):
+        self._entries.pop(region, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ClockPolicy(EvictionPolicy):
+
+    """Approximates LRU using the CLOCK algorithm: all mapped regions are kept in a ring, and each access
+    sets the region's reference bit. The clock hand clears reference bits until it finds an unused
+    region whose bit is not set.
+
+    **Note:** as used regions stay in the ring, the hand has to pass over them when searching for a victim"""
+    __slots__ = (
+        '_ring',        # ordered mapping of region -> [regions, referenced], the hand is at the first item
+        '_num_unused',  # amount of regions in the ring without clients
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._ring = OrderedDict()
+        self._num_unused = 0
+
+    def insert(self, region, regions):
+        self._ring[region] = [regions, False]
+        self._num_unused += 1
+
+    def acquire(self, region):
+        EvictionPolicy.acquire(self, region)
+        entry = self._ring.get(region)
+        if entry is not None:
+            entry[1] = True
+            # the given region was unused so far if the new client is its only one
+            if region._uc == 2:
+                self._num_unused -= 1
+            # END handle unused region
+        # END handle known region
+
+    def release(self, region, regions):
+        entry = self._ring.get(region)
+        if entry is None:
+            self._ring[region] = [regions, True]
+        # END handle unknown region
+        self._num_unused += 1
+
+    def touch(self, region, regions):
+        EvictionPolicy.acquire(self, region)
+        entry = self._ring.get(region)
+        if entry is not None:
+            entry[1] = True
+        # END handle known region
+
+    def evict(self):
+        if not self._num_unused:
+            return None
+        # END early bailout
+        ring = self._ring
+        while True:
+            region, entry = next(iter(ring.items()))
+            if region._uc == 1 and not entry[1]:
+                del ring[region]
+                self._num_unused -= 1
+                return region, entry[0]
+            # END found victim
+            entry[1] = False
+            ring.move_to_end(region)
+        # END while searching
+
+    def discard(self, region):
+        if self._ring.pop(region, None) is not None and region._uc == 1:
+            self._num_unused -= 1
+        # END handle known region
+
+    def __len__(self):
+        return self._num_unused
+
+
+class TwoQueuePolicy(EvictionPolicy):
+
+    """A scan resistant policy implementing the 2Q algorithm.
+
+    Regions which were used only once are kept in a FIFO queue, regions which were used more often
+    in an LRU queue. Regions in the FIFO queue are evicted first unless it became small in relation
+    to the LRU queue. This way, regions touched only once by a large sequential read will not cause
+    frequently used regions to be unmapped.
+
+    The positions of regions recently evicted from the FIFO queue are remembered. If such a position
+    is mapped again, the new region is considered frequently used right away."""
+    __slots__ = (
+        '_a1in',        # ordered mapping of unused regions used at most once -> regions list
+        '_am',          # ordered mapping of unused regions used more than once -> regions list
+        '_a1out',       # ordered set of (path_or_fd, offset) of regions evicted from _a1in
+        '_kin',         # fraction of unused regions which may be kept in _a1in before evicting from _am
+        '_max_ghosts',  # maximum amount of positions to remember in _a1out
+    )
+
+    def __init__(self, kin=0.25, max_ghosts=1024):
+        """
+        :param kin: fraction of unused regions which are allowed to be in the FIFO queue. As long
+            as it holds more regions, they will be evicted before frequently used regions
+        :param max_ghosts: amount of positions of evicted regions to remember"""
+        super().__init__()
+        self._a1in = OrderedDict()
+        self._am = OrderedDict()
+        self._a1out = OrderedDict()
+        self._kin = kin
+        self._max_ghosts = max_ghosts
+
+    def insert(self, region, regions):
+        key = (regions.path_or_fd(), region._b)
+        if self._a1out.pop(key, None) is not None:
+            # we have seen it before - once used, it will be put into the LRU queue
+            region._hits += 1
+        # END handle ghost hit
+        self.release(region, regions)
+
+    def acquire(self, region):
+        EvictionPolicy.acquire(self, region)
+        if self._a1in.pop(region, None) is None:
+            self._am.pop(region, None)
+        # END remove from queues
+
+    def release(self, region, regions):
+        if region._hits > 1:
+            self._am[region] = regions
+        else:
+            self._a1in[region] = regions
+        # END select queue
+
+    def evict(self):
+        a1in = self._a1in
+        am = self._am
+        if a1in and (not am or len(a1in) > self._kin * (len(a1in) + len(am))):
+            region, regions = a1in.popitem(last=False)
+            a1out = self._a1out
+            a1out[(regions.path_or_fd(), region._b)] = True
+            if len(a1out) > self._max_ghosts:
+                a1out.popitem(last=False)
+            # END limit ghosts
+            return region, regions
+        # END evict from fifo
+        if am:
+            return am.popitem(last=False)
+        return None
+
+    def discard(self, region):
+        if self._a1in.pop(region, None) is None:
+            self._am.pop(region, None)
+        # END remove from queues
+
+    def __len__(self):
+        return len(self._a1in) + len(self._am)
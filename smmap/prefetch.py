@@ -0,0 +1,103 @@
+"""Module with a prefetcher mapping windows ahead of sequential readers in a background thread"""
+from .util import MADV_WILLNEED
+
+from queue import Queue, Empty
+from threading import Thread
+import weakref
+
+__all__ = ["WindowPrefetcher"]
+
+
+class WindowPrefetcher:
+
+    """Maps windows of a sliding window manager in a background thread, and advises the system to
+    read their pages. Once a cursor reaches the window, it is already mapped and can be used right away.
+
+    The manager schedules a window once it sees a cursor move from one window to the next one. As the
+    prefetcher changes the manager's state from another thread, the manager must be thread-safe.
+
+    **Note:** the background thread ends once there was nothing to do for idle_timeout seconds, and
+    is restarted on demand"""
+    __slots__ = (
+        '_manager',         # weak reference to the manager we map windows for
+        '_queue',           # queue of (regions, offset, flags) tuples to map
+        '_pending',         # set of (id(regions), offset) tuples which are queued
+        '_thread',          # our worker thread or None if it is not running
+        '_idle_timeout',    # seconds to wait for work before the thread ends
+    )
+
+    def __init__(self, manager, idle_timeout=1.0):
+        """Initialize the prefetcher for the given manager, which must be thread-safe"""
+        assert manager.is_thread_safe(), "Prefetching requires a thread-safe manager"
+        self._manager = weakref.ref(manager)
+        self._queue = Queue()
+        self._pending = set()
+        self._thread = None
+        self._idle_timeout = idle_timeout
+
+    def _run(self):
+        """Map all queued windows until there is nothing to do for a while"""
+        queue = self._queue
+        while True:
+            try:
+                regions, offset, flags = queue.get(timeout=self._idle_timeout)
+            except Empty:
+                man = self._manager()
+                if man is None:
+                    return
+                with man._lock:
+                    # the queue may have been filled before we took the lock
+                    if queue.empty():
+                        self._thread = None
+                        return
+                continue
+            # END handle idle thread
+
+            try:
+                man = self._manager()
+                if man is None:
+                    return
+                # END handle manager gone
+                region = None
+                with man._lock:
+                    self._pending.discard((id(regions), offset))
+                    if offset < regions.file_size():
+                        region = man._obtain_region(regions, offset, man._window_size_of(regions), flags, False)
+                    # END handle end of file
+                # END with lock
+                if region is not None:
+                    # fails silently if the region was unmapped in the meanwhile
+                    region.advise(MADV_WILLNEED)
+                # END read ahead
+            except Exception:
+                # prefetching is an optimization, failing to map is fine - the reader will try again
+                pass
+            finally:
+                queue.task_done()
+            # END handle mapping
+        # END while there is work
+
+    #{ Interface
+
+    def schedule(self, regions, offset, flags=0):
+        """Map the window at the given offset into the file of the given regions list in the background.
+        Must be called while holding the manager's lock.
+        :param regions: the MapRegionList of the file to map
+        :param offset: absolute offset into the file the window should contain
+        :param flags: additional flags to be given to os.open when mapping the window"""
+        key = (id(regions), offset)
+        if key in self._pending:
+            return
+        # END skip queued windows
+        self._pending.add(key)
+        self._queue.put((regions, offset, flags))
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name="smmap-prefetch", daemon=True)
+            self._thread.start()
+        # END start thread
+
+    def wait(self):
+        """Block until all scheduled windows have been mapped"""
+        self._queue.join()
+
+    #} END interface
@@ -0,0 +1,355 @@
+"""Benchmarks of the hot paths of cursors, buffers and region eviction, compared with plain os.pread.
+
+Run them using ``python -m smmap.test.bench``, see ``--help`` for options. Results can be written as
+JSON to track them between releases."""
+from smmap.mman import StaticWindowMapManager, SlidingWindowMapManager
+from smmap.buf import SlidingWindowMapBuffer
+from smmap.util import ALLOCATIONGRANULARITY
+from smmap.limits import open_files_limit
+import smmap
+
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+
+__all__ = ["BenchmarkSuite", "main"]
+
+#{ Utilities
+
+
+def _pread(fd, size, offset):
+    """os.pread, emulated where it isn't available"""
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+pread = getattr(os, 'pread', _pread)
+
+#} END utilities
+
+
+class BenchmarkSuite:
+
+    """Runs all benchmarks on temporary files and collects their results.
+
+    Each result measures one operation, which is performed a given amount of times. Its timing is the
+    best of a few repetitions, to reduce the influence of other processes"""
+
+    #{ Configuration
+    repeat = 3
+    #} END configuration
+
+    def __init__(self, scale=1.0):
+        """:param scale: factor for the size of files and the amount of operations"""
+        self._scale = scale
+        self._dir = tempfile.mkdtemp(prefix="smmap_bench")
+        self._results = list()
+
+    def _scaled(self, num):
+        return max(int(num * self._scale), 1)
+
+    def _make_file(self, name, size):
+        """:return: path to a new file with the given size, filled with non-zero bytes"""
+        path = os.path.join(self._dir, name)
+        chunk = bytes(range(256)) * 4096
+        with open(path, 'wb') as fp:
+            remaining = size
+            while remaining:
+                remaining -= fp.write(chunk[:remaining])
+            # END while there are bytes to write
+        return path
+
+    def _record(self, group, name, num_ops, func, num_bytes=0):
+        """Time the given function, which performs num_ops operations, and record the result"""
+        best = None
+        for _ in range(self.repeat):
+            st = perf_counter()
+            func()
+            elapsed = perf_counter() - st
+            best = elapsed if best is None else min(best, elapsed)
+        # END for each repetition
+        best = max(best, 1e-9)
+        result = dict(group=group, name=name, ops=num_ops, seconds=best,
+                      ns_per_op=best * 1e9 / num_ops, ops_per_second=num_ops / best)
+        if num_bytes:
+            result['mb_per_second'] = num_bytes / best / (1024 * 1024)
+        # END handle throughput
+        self._results.append(result)
+        return result
+
+    #{ Benchmarks
+
+    def bench_cursor(self):
+        """use_region() reusing the current region, switching between mapped regions, and mapping new ones"""
+        window_size = 64 * ALLOCATIONGRANULARITY
+        num_windows = 64
+        path = self._make_file("cursor", window_size * num_windows)
+        num_ops = self._scaled(200000)
+
+        man = SlidingWindowMapManager(window_size=window_size)
+        c = man.make_cursor(path)
+        c.use_region(0, 1)
+
+        def current_region():
+            use_region = c.use_region
+            for i in range(num_ops):
+                use_region(i & 0xfff, 1)
+        self._record('cursor', 'use_region current region', num_ops, current_region)
+
+        # map all windows first
+        for i in range(num_windows):
+            c.use_region(i * window_size, 1)
+        # END map all
+
+        def mapped_region():
+            use_region = c.use_region
+            for i in range(num_ops):
+                use_region((i % num_windows) * window_size, 1)
+        self._record('cursor', 'use_region mapped region', num_ops, mapped_region)
+
+        # at most two windows fit, each switch maps a new one
+        man = SlidingWindowMapManager(window_size=window_size, max_memory_size=window_size * 2)
+        mc = man.make_cursor(path)
+        num_maps = self._scaled(5000)
+
+        def new_region():
+            use_region = mc.use_region
+            for i in range(num_maps):
+                use_region((i % num_windows) * window_size, 1)
+        self._record('cursor', 'use_region new region', num_maps, new_region)
+
+        def new_cursor():
+            make_cursor = man.make_cursor
+            for _ in range(num_maps):
+                nc = make_cursor(path)
+                nc.use_region(0, 1)
+                nc.release()
+        self._record('cursor', 'make_cursor and release', num_maps, new_cursor)
+
+        def new_cursor_block():
+            make_cursor = man.make_cursor
+            for _ in range(num_maps):
+                with make_cursor(path) as nc:
+                    nc.use_region(0, 1)
+        self._record('cursor', 'make_cursor in with block', num_maps, new_cursor_block)
+
+        def pooled_cursor():
+            acquire_cursor = man.acquire_cursor
+            for _ in range(num_maps):
+                with acquire_cursor(path) as pc:
+                    pc.use_region(0, 1)
+        self._record('cursor', 'acquire_cursor and release', num_maps, pooled_cursor)
+
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            def preads():
+                for i in range(num_ops):
+                    pread(fd, 1, (i % num_windows) * window_size)
+            self._record('cursor', 'os.pread 1 byte', num_ops, preads)
+        finally:
+            os.close(fd)
+        # END close file
+
+    def bench_buffer(self):
+        """Byte and slice access of a SlidingWindowMapBuffer within a window and across windows"""
+        window_size = 16 * ALLOCATIONGRANULARITY
+        size = window_size * 64
+        path = self._make_file("buffer", size)
+        num_ops = self._scaled(200000)
+        slice_size = 256
+
+        man = SlidingWindowMapManager(window_size=window_size)
+        buf = SlidingWindowMapBuffer(man.make_cursor(path))
+        try:
+            def byte_in_window():
+                for i in range(num_ops):
+                    buf[i & 0xfff]
+            self._record('buffer', 'byte within window', num_ops, byte_in_window)
+
+            def byte_across_windows():
+                for i in range(num_ops):
+                    buf[(i & 1) * window_size]
+            self._record('buffer', 'byte alternating windows', num_ops, byte_across_windows)
+
+            def slice_in_window():
+                for i in range(num_ops):
+                    ofs = i & 0xfff
+                    buf[ofs:ofs + slice_size]
+            self._record('buffer', 'slice within window', num_ops, slice_in_window, num_ops * slice_size)
+
+            def slice_across_windows():
+                for i in range(num_ops):
+                    ofs = (i % 63 + 1) * window_size - slice_size // 2
+                    buf[ofs:ofs + slice_size]
+            self._record('buffer', 'slice spanning windows', num_ops, slice_across_windows,
+                         num_ops * slice_size)
+        finally:
+            buf.end_access()
+        # END release buffer
+
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            def preads():
+                for i in range(num_ops):
+                    pread(fd, slice_size, i & 0xfff)
+            self._record('buffer', 'os.pread slice', num_ops, preads, num_ops * slice_size)
+        finally:
+            os.close(fd)
+        # END close file
+
+    def bench_eviction(self):
+        """Mapping regions while all memory is used, which requires evicting one region per mapping"""
+        num_files = self._scaled(1000)
+        regions_per_file = 10
+        # each mapped region uses a file descriptor, stay well within the limit of the process
+        max_open_files = open_files_limit()
+        if max_open_files is not None:
+            num_files = max(min(num_files, max_open_files // 2 // regions_per_file), 1)
+        # END handle open files limit
+        window_size = ALLOCATIONGRANULARITY
+        paths = [self._make_file("evict_%i" % i, window_size * regions_per_file) for i in range(num_files)]
+        num_regions = num_files * regions_per_file
+
+        man = SlidingWindowMapManager(window_size=window_size, max_memory_size=num_regions * window_size)
+        cursors = [man.make_cursor(path) for path in paths]
+        # fill the manager with idle regions
+        for c in cursors:
+            for i in range(regions_per_file):
+                c.use_region(i * window_size, 1)
+            # END for each region
+            c.unuse_region()
+        # END for each cursor
+        assert man.num_file_handles() == num_regions
+
+        # each mapping requires another region to be evicted
+        man._max_memory_size = (num_regions - 1) * window_size
+        extra = self._make_file("evict_extra", window_size * num_regions)
+        ec = man.make_cursor(extra)
+        num_ops = self._scaled(2000)
+        state = dict(ofs=0)
+
+        def evict():
+            use_region = ec.use_region
+            ofs = state['ofs']
+            for _ in range(num_ops):
+                use_region(ofs, 1)
+                ofs = (ofs + window_size) % (window_size * num_regions)
+            # END for each new region
+            state['ofs'] = ofs
+        result = self._record('eviction', 'map with eviction, %i regions in %i files' % (num_regions, num_files),
+                              num_ops, evict)
+        result['regions'] = num_regions
+        result['files'] = num_files
+        ec.release()
+        for c in cursors:
+            c.release()
+        # END for each cursor
+        man.collect()
+
+    def bench_managers(self):
+        """Reading a file sequentially in chunks using static and sliding managers, and os.pread"""
+        size = self._scaled(64 * 1024 * 1024)
+        path = self._make_file("managers", size)
+        chunk_size = 64 * 1024
+        num_ops = size // chunk_size
+
+        for name, man in (('static', StaticWindowMapManager()),
+                          ('sliding', SlidingWindowMapManager(window_size=4 * 1024 * 1024))):
+            c = man.make_cursor(path)
+
+            def read_file():
+                read = c.read
+                for i in range(num_ops):
+                    read(i * chunk_size, chunk_size)
+            self._record('managers', '%s manager sequential read' % name, num_ops, read_file,
+                         num_ops * chunk_size)
+            c.unuse_region()
+            man.collect()
+        # END for each manager
+
+        man = StaticWindowMapManager()
+        with man.make_cursor(path) as c:
+            view = c.file_view()
+
+            def read_view():
+                for i in range(num_ops):
+                    bytes(view[i * chunk_size:(i + 1) * chunk_size])
+            self._record('managers', 'static manager file_view sequential read', num_ops, read_view,
+                         num_ops * chunk_size)
+        # END release cursor
+        man.collect()
+
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            def preads():
+                for i in range(num_ops):
+                    pread(fd, chunk_size, i * chunk_size)
+            self._record('managers', 'os.pread sequential read', num_ops, preads, num_ops * chunk_size)
+        finally:
+            os.close(fd)
+        # END close file
+
+    #} END benchmarks
+
+    #{ Interface
+
+    benchmarks = ('cursor', 'buffer', 'eviction', 'managers')
+
+    def run(self, names=None):
+        """Run the benchmarks with the given names, or all of them
+        :return: list of result dicts"""
+        try:
+            for name in names or self.benchmarks:
+                getattr(self, 'bench_' + name)()
+            # END for each benchmark
+        finally:
+            shutil.rmtree(self._dir, ignore_errors=True)
+        # END cleanup
+        return self._results
+
+    def report(self):
+        """:return: dict with our results and information about the environment, suitable for json"""
+        return dict(smmap_version=smmap.__version__, python=sys.version.split()[0],
+                    implementation=platform.python_implementation(), platform=platform.platform(),
+                    scale=self._scale, results=self._results)
+
+    #} END interface
+
+
+def main(args=None):
+    parser = ArgumentParser(prog="python -m smmap.test.bench", description=__doc__.splitlines()[0])
+    parser.add_argument('benchmarks', nargs='*', choices=[[]] + list(BenchmarkSuite.benchmarks),
+                        help="benchmarks to run, all by default")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="factor for file sizes and the amount of operations, default 1.0")
+    parser.add_argument('--json', metavar='PATH', help="write results as json to the given path, or - for stdout")
+    opts = parser.parse_args(args)
+
+    suite = BenchmarkSuite(opts.scale)
+    results = suite.run(opts.benchmarks)
+    if opts.json == '-':
+        json.dump(suite.report(), sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return 0
+    # END handle json output
+    for res in results:
+        line = "%-10s %-52s %12.1f ns/op" % (res['group'], res['name'], res['ns_per_op'])
+        if 'mb_per_second' in res:
+            line += " %10.1f MB/s" % res['mb_per_second']
+        print(line)
+    # END for each result
+    if opts.json:
+        with open(opts.json, 'w') as fp:
+            json.dump(suite.report(), fp, indent=2)
+        # END write file
+    # END handle json file
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
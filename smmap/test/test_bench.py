@@ -0,0 +1,20 @@
+from .lib import TestBase
+
+from smmap.test.bench import BenchmarkSuite
+
+import json
+
+
+class TestBench(TestBase):
+
+    def test_suite(self):
+        # run everything at a tiny scale to be sure the benchmarks keep working
+        suite = BenchmarkSuite(scale=0.01)
+        suite.repeat = 1
+        results = suite.run()
+        assert {res['group'] for res in results} == set(BenchmarkSuite.benchmarks)
+        for res in results:
+            assert res['ops'] > 0 and res['ns_per_op'] > 0
+        # END for each result
+        report = json.loads(json.dumps(suite.report()))
+        assert report['results'] == results
@@ -4,10 +4,11 @@ from smmap.mman import (
     SlidingWindowMapManager,
     StaticWindowMapManager
 )
-from smmap.buf import SlidingWindowMapBuffer
+from smmap.buf import SlidingWindowMapBuffer, WindowSegments
 
 from random import randint
 from time import time
+import struct
 import sys
 import os
 
@@ -124,3 +125,68 @@ class TestBuf(TestBase):
                 # END for each manager
             # END for each input
             os.close(fd)
+
+    def test_segments(self):
+        with FileCreator(self.k_window_test_size, "segments_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+            man = SlidingWindowMapManager(window_size=fc.size // 10, max_memory_size=fc.size // 4)
+            buf = SlidingWindowMapBuffer(man.make_cursor(fc.path))
+
+            # within a window, there is just one segment
+            with buf.segments(10, 20) as segs:
+                assert isinstance(segs, WindowSegments)
+                assert len(segs) == 1 and segs.nbytes() == 10
+                assert segs.tobytes() == data[10:20]
+            # END with segments
+
+            # spanning all windows of the file, more than we may keep mapped
+            segs = buf.segments(-fc.size + 100)
+            assert len(segs) > 4
+            assert len(set(segs._regions)) == len(segs)
+            assert segs.nbytes() == fc.size - 100
+            assert b''.join(segs) == data[100:]
+            assert segs.tobytes() == data[100:]
+            assert all(isinstance(v, memoryview) for v in segs)
+
+            # their regions are in use and cannot be collected
+            regions = list(segs._regions)
+            man.collect()
+            assert all(r.client_count() > 1 for r in regions)
+            assert man.num_file_handles() >= len(regions)
+
+            segs.release()
+            segs.release()
+            assert len(segs) == 0
+            buf.end_access()
+            assert man.collect() and man.num_file_handles() == 0
+            assert all(r.client_count() == 0 for r in regions)
+
+            # segments still exported to others don't keep their regions in use
+            assert buf.begin_access()
+            segs = buf.segments(10, 20)
+            region = segs._regions[0]
+            values = struct.iter_unpack('B', segs[0])
+            assert region.client_count() == 3
+            segs.release()
+            assert region.client_count() == 2
+            buf.end_access()
+            assert man.collect() == 1 and man.num_file_handles() == 0
+            assert next(values) == (data[10],)
+            del values
+
+    def test_readinto(self):
+        with FileCreator(self.k_window_test_size, "buffer_readinto_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+            buf = SlidingWindowMapBuffer(man_worst_case.make_cursor(fc.path))
+            dst = bytearray(fc.size // 3)
+            for ofs in (0, 100, fc.size // 2, -len(dst)):
+                assert buf.readinto(ofs, dst) == len(dst)
+                assert dst == data[ofs:][:len(dst)]
+            # END for each offset
+
+            # limited by the size of the buffer
+            assert buf.readinto(fc.size - 10, dst) == 10
+            assert dst[:10] == data[-10:]
+            buf.end_access()
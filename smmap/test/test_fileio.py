@@ -0,0 +1,116 @@
+from .lib import TestBase
+
+from smmap.mman import SlidingWindowMapManager, StaticWindowMapManager
+from smmap.fileio import WindowFileIO
+
+import io
+import os
+import tempfile
+import zlib
+
+
+class TestFileIO(TestBase):
+
+    def setUp(self):
+        lines = [b"line %i %s\n" % (i, b"x" * (i % 300)) for i in range(50000)]
+        self.data = b''.join(lines) + b"no newline at the end"
+        with tempfile.NamedTemporaryFile("wb", prefix="fileio_test", delete=False) as file:
+            self.path = file.name
+            file.write(self.data)
+        # END write file
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_file(self):
+        data = self.data
+        for man in (StaticWindowMapManager(),
+                    SlidingWindowMapManager(window_size=len(data) // 17, max_memory_size=len(data) // 5)):
+            # the failed instance is closed upon destruction, which must work as well
+            instances = list()
+
+            class RecordingFileIO(WindowFileIO):
+                __slots__ = tuple()
+
+                def __init__(self, cursor):
+                    instances.append(self)
+                    super().__init__(cursor)
+            # END recording file
+            self.assertRaises(ValueError, RecordingFileIO, man.WindowCursorCls(man))
+            instances.pop().close()
+
+            with WindowFileIO(man.make_cursor(self.path)) as fp:
+                assert fp.readable() and fp.seekable() and not fp.writable()
+                assert fp.cursor().is_associated()
+
+                # reading and seeking
+                assert fp.read(10) == data[:10]
+                assert fp.tell() == 10
+                assert fp.seek(-5, io.SEEK_END) == len(data) - 5
+                assert fp.read() == data[-5:]
+                assert fp.read() == b''
+                assert fp.seek(len(data) // 2) == len(data) // 2
+                assert fp.read(len(data) // 3) == data[len(data) // 2:len(data) // 2 + len(data) // 3]
+                assert fp.seek(-10, io.SEEK_CUR)
+                self.assertRaises(ValueError, fp.seek, -1)
+                self.assertRaises(ValueError, fp.seek, 0, 5)
+
+                # beyond the end, nothing can be read
+                fp.seek(len(data) + 10)
+                assert fp.read(10) == b'' and fp.readinto(bytearray(10)) == 0
+
+                # peeking doesn't change the position
+                fp.seek(100)
+                assert fp.peek(20) == data[100:120]
+                assert fp.peek() == data[100:100 + io.DEFAULT_BUFFER_SIZE]
+                assert fp.tell() == 100
+
+                # reading everything and reading into buffers
+                fp.seek(0)
+                assert fp.readall() == data
+                fp.seek(3)
+                buf = bytearray(len(data))
+                assert fp.readinto(buf) == len(data) - 3
+                assert buf[:len(data) - 3] == data[3:]
+
+                # lines are found across windows
+                fp.seek(0)
+                assert fp.readlines() == io.BytesIO(data).readlines()
+                fp.seek(0)
+                assert fp.readline(3) == data[:3]
+                assert list(fp)[-1] == b"no newline at the end"
+            # END with file
+            assert fp.closed
+            self.assertRaises(ValueError, fp.read)
+            assert man.collect()
+        # END for each manager
+
+    def test_compatibility(self):
+        man = SlidingWindowMapManager(window_size=len(self.data) // 7)
+
+        # offsets and sizes limit the file
+        with WindowFileIO(man.make_cursor(self.path), 10, 100) as fp:
+            assert fp.read() == self.data[10:110]
+            assert fp.seek(0, io.SEEK_END) == 100
+        # END with file
+
+        # buffered readers and streaming decompression
+        with io.BufferedReader(WindowFileIO(man.make_cursor(self.path))) as fp:
+            assert fp.read(5) == self.data[:5]
+            assert fp.readline() == self.data[5:self.data.index(b'\n') + 1]
+        # END with file
+
+        compressed = zlib.compress(self.data)
+        with open(self.path, 'wb') as file:
+            file.write(compressed)
+        # END rewrite file
+        d = zlib.decompressobj()
+        out = list()
+        with WindowFileIO(SlidingWindowMapManager(window_size=len(compressed) // 3).make_cursor(self.path)) as fp:
+            chunk = fp.read(4096)
+            while chunk:
+                out.append(d.decompress(chunk))
+                chunk = fp.read(4096)
+            # END for each chunk
+        # END with file
+        assert b''.join(out) + d.flush() == self.data
@@ -0,0 +1,95 @@
+from .lib import TestBase
+
+from smmap import limits
+from smmap.limits import (
+    memory_limit,
+    open_files_limit,
+    auto_limits
+)
+from smmap.mman import SlidingWindowMapManager, ShardedWindowMapManager
+
+import os
+import shutil
+import sys
+import tempfile
+
+
+class TestLimits(TestBase):
+
+    def setUp(self):
+        self._root = tempfile.mkdtemp(prefix="smmap_limits")
+        self._prev = (limits.CGROUP_ROOT, limits.PROC_CGROUP, limits.PROC_MEMINFO)
+        limits.CGROUP_ROOT = os.path.join(self._root, 'cgroup')
+        limits.PROC_CGROUP = os.path.join(self._root, 'proc_cgroup')
+        limits.PROC_MEMINFO = os.path.join(self._root, 'meminfo')
+
+    def tearDown(self):
+        limits.CGROUP_ROOT, limits.PROC_CGROUP, limits.PROC_MEMINFO = self._prev
+        shutil.rmtree(self._root)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(data)
+
+    def test_memory_limit(self):
+        # nothing is known
+        assert memory_limit() is None
+        assert auto_limits(1000)[0] == 1000
+
+        self._write(limits.PROC_MEMINFO, "MemTotal:        1000 kB\nMemFree:          500 kB\n")
+        assert memory_limit() == 1000 * 1024
+
+        # cgroup v2 considers all parent groups
+        self._write(limits.PROC_CGROUP, "0::/outer/inner\n")
+        self._write(os.path.join(limits.CGROUP_ROOT, 'outer', 'inner', 'memory.max'), "max\n")
+        self._write(os.path.join(limits.CGROUP_ROOT, 'outer', 'memory.max'), "4096\n")
+        assert memory_limit() == 4096
+
+        # cgroup v1
+        self._write(limits.PROC_CGROUP, "4:cpu,memory:/docker/abc\n1:cpu:/\n")
+        self._write(os.path.join(limits.CGROUP_ROOT, 'memory', 'memory.limit_in_bytes'), "8192\n")
+        assert memory_limit() == 8192
+        assert auto_limits(1 << 40, memory_fraction=0.25)[0] == 2048
+        # the limits never exceed the defaults
+        assert auto_limits(100)[0] == 100
+
+    def test_open_files_limit(self):
+        limit = open_files_limit()
+        assert limit is None or limit > 0
+        max_open_handles = auto_limits(1000)[1]
+        if limit is None:
+            assert max_open_handles == sys.maxsize
+        else:
+            assert max_open_handles == max(limit // 2, 1)
+        # END handle platform support
+
+    def test_manager(self):
+        mem_file = os.path.join(limits.CGROUP_ROOT, 'memory.max')
+        self._write(limits.PROC_CGROUP, "0::/\n")
+        self._write(mem_file, "%i\n" % (64 * 1024 * 1024))
+
+        # explicit limits are kept
+        man = SlidingWindowMapManager(max_memory_size=1000, auto_limits=True)
+        assert man.max_mapped_memory_size() == 1000
+        assert SlidingWindowMapManager().max_file_handles() == sys.maxsize
+
+        man = SlidingWindowMapManager(auto_limits=True, limits_refresh_interval=3600)
+        assert man.max_mapped_memory_size() == 32 * 1024 * 1024
+        assert man.max_dirty_memory_size() == 8 * 1024 * 1024
+        if open_files_limit() is not None:
+            assert man.max_file_handles() < sys.maxsize
+        # END handle platform support
+
+        # the container shrinks
+        self._write(mem_file, "%i\n" % (16 * 1024 * 1024))
+        assert man.max_mapped_memory_size() == 32 * 1024 * 1024
+        man._limits_deadline = 0
+        man._check_limits()
+        assert man.max_mapped_memory_size() == 8 * 1024 * 1024
+        self._write(mem_file, "%i\n" % (8 * 1024 * 1024))
+        assert man.refresh_limits()[0] == 4 * 1024 * 1024
+
+        # sharded managers divide the limits among their shards
+        man = ShardedWindowMapManager(num_shards=2, auto_limits=True)
+        assert man.max_mapped_memory_size() == 4 * 1024 * 1024
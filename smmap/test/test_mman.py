@@ -3,15 +3,30 @@ from .lib import TestBase, FileCreator
 from smmap.mman import (
     WindowCursor,
     SlidingWindowMapManager,
-    StaticWindowMapManager
+    StaticWindowMapManager,
+    ShardedWindowMapManager
 )
-from smmap.util import align_to_mmap
+from smmap.util import (align_to_mmap, MADV_RANDOM, MADV_SEQUENTIAL, ACCESS_READ, ACCESS_WRITE, ACCESS_COPY,
+                         HUGE_PAGE_SIZE)
 
-from random import randint
+from random import Random, randint
+from threading import Thread, RLock
 from time import time
 import os
+import re
+import struct
 import sys
+import tempfile
+import weakref
 from copy import copy
+import gc
+from unittest import skipIf
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+# END handle optional numpy
 
 
 class TestMMan(TestBase):
@@ -222,3 +237,906 @@ class TestMMan(TestBase):
                 # END for each manager type
             finally:
                 os.close(fd)
+
+    def test_lru_collection(self):
+        with FileCreator(self.k_window_test_size, "lru_collection_test") as fc:
+            winsize = align_to_mmap(fc.size // 10, True)
+            man = SlidingWindowMapManager(window_size=winsize, max_memory_size=winsize * 3)
+            c = man.make_cursor(fc.path)
+
+            # map three windows, releasing them in order
+            regions = list()
+            for i in range(3):
+                assert c.use_region(i * winsize, 1).is_valid()
+                regions.append(c.region())
+            c.unuse_region()
+            assert man.num_file_handles() == 3
+            assert list(man._policy._lru) == regions
+
+            # re-using a region makes it the most recently used one, once the hit is passed to the policy
+            assert c.use_region(0, 1).is_valid()
+            c.unuse_region()
+            assert list(man._policy._lru) == regions
+            man._replay_hits()
+            assert list(man._policy._lru) == regions[1:] + regions[:1]
+
+            # regions in use are never collected, they are detached from the policy until released
+            assert c.use_region(winsize * 2, 1).is_valid()
+            assert man._collect_lru_region(0) == 2
+            assert man.num_file_handles() == 1
+            assert c.region() is regions[2] and c.region().client_count() == 2
+            assert not len(man.policy())
+
+            # the least recently released region goes first once memory is needed
+            c.unuse_region()
+            for i in (3, 4, 5):
+                assert c.use_region(i * winsize, 1).is_valid()
+            c.unuse_region()
+            assert man.num_file_handles() == 3
+            assert regions[2] not in c._rlist
+            assert man.mapped_memory_size() <= man.max_mapped_memory_size()
+
+    def test_thread_safety(self):
+        with FileCreator(self.k_window_test_size, "thread_safety_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+
+            assert not SlidingWindowMapManager().is_thread_safe()
+            man = SlidingWindowMapManager(window_size=fc.size // 100, max_memory_size=fc.size // 3,
+                                          max_open_handles=15, thread_safe=True)
+            assert man.is_thread_safe()
+            errors = list()
+
+            def read(seed):
+                try:
+                    rand = Random(seed)
+                    c = man.make_cursor(fc.path)
+                    for _ in range(2000):
+                        ofs = rand.randint(0, fc.size - 1)
+                        assert c.use_region(ofs, 100).is_valid()
+                        assert c.buffer()[:] == data[ofs:ofs + c.size()]
+                        if rand.randint(0, 1):
+                            c.unuse_region()
+                    # END for each access
+                    c.unuse_region()
+                except Exception as exc:
+                    errors.append(exc)
+                # END handle errors
+
+            threads = [Thread(target=read, args=(i,)) for i in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            # END for each thread
+            assert not errors, errors
+
+            # all regions are unused, and the accounting matches what is mapped
+            rlist = man.make_cursor(fc.path)._rlist
+            assert man.num_file_handles() == len(rlist) == len(man.policy())
+            assert man.mapped_memory_size() == sum(r.size() for r in rlist)
+            assert all(r.client_count() == 1 for r in rlist)
+            assert man.collect() and man.num_file_handles() == 0
+
+    def test_lock_free_hits(self):
+        class CountingLock:
+            def __init__(self):
+                self.count = 0
+                self._lock = RLock()
+
+            def __enter__(self):
+                self.count += 1
+                return self._lock.__enter__()
+
+            def __exit__(self, *args):
+                return self._lock.__exit__(*args)
+        # END counting lock
+
+        with FileCreator(self.k_window_test_size, "lock_free_hits_test") as fc:
+            winsize = align_to_mmap(fc.size // 10, True)
+            man = SlidingWindowMapManager(window_size=winsize, thread_safe=True)
+            lock = man._lock = CountingLock()
+            a = man.make_cursor(fc.path)
+            b = man.make_cursor(fc.path)
+            assert a.use_region(0, 1).is_valid()
+            assert a.use_region(winsize, 1).is_valid()
+            num_locks = lock.count
+
+            # moving to regions mapped already, and releasing them, doesn't take the lock
+            for _ in range(10):
+                assert b.use_region(0, 1).region() is not a.region()
+                assert b.use_region(winsize, 1).region() is a.region()
+                assert a.region().client_count() == 3
+                b.unuse_region()
+            # END for each hit
+            assert lock.count == num_locks
+            assert man.stats()['hits'] == 20
+
+            # regions detached for unmapping are only used while holding the lock
+            region = a.region()
+            a.unuse_region()
+            with lock:
+                assert man._claim_region(region)
+                man._policy.discard(region)
+            assert b.use_region(winsize, 1).region() is region
+            assert lock.count > num_locks
+            # the last cursor releasing it makes it known to the policy again
+            b.release()
+            assert not region._detached and region in man._policy._lru
+            a.release()
+
+    def test_sharded_manager(self):
+        fcs = [FileCreator(self.k_window_test_size, "sharded_test_%i" % i) for i in range(4)]
+        try:
+            datas = list()
+            for fc in fcs:
+                with open(fc.path, 'rb') as fp:
+                    datas.append(fp.read())
+            # END for each file
+            size = fcs[0].size
+            man = ShardedWindowMapManager(num_shards=3, window_size=size // 100, max_memory_size=size // 2,
+                                          max_open_handles=30)
+            assert len(man.shards()) == 3
+            assert man.is_thread_safe()
+            assert man.max_mapped_memory_size() <= size // 2
+            assert man.max_file_handles() == 30
+            assert man.window_size() == man.shards()[0].window_size()
+
+            # all cursors of a file are handled by the same shard
+            c = man.make_cursor(fcs[0].path)
+            assert c._manager is man.shard_for(fcs[0].path)
+            assert man.make_cursor(fcs[0].path)._rlist is c._rlist
+            assert man.num_open_files() == 0 and man.mapped_memory_size() == 0
+
+            errors = list()
+
+            def read(seed):
+                try:
+                    rand = Random(seed)
+                    for _ in range(500):
+                        fid = rand.randint(0, len(fcs) - 1)
+                        c = man.make_cursor(fcs[fid].path)
+                        ofs = rand.randint(0, size - 1)
+                        assert c.use_region(ofs, 100).is_valid()
+                        assert c.buffer()[:] == datas[fid][ofs:ofs + c.size()]
+                        c.unuse_region()
+                    # END for each access
+                except Exception as exc:
+                    errors.append(exc)
+                # END handle errors
+
+            threads = [Thread(target=read, args=(i,)) for i in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            # END for each thread
+            assert not errors, errors
+            assert man.num_open_files()
+
+            # limits may move between shards, but their total stays the same
+            assert man.max_mapped_memory_size() == sum(s.max_mapped_memory_size() for s in man.shards())
+            assert man.max_mapped_memory_size() <= size // 2
+            assert man.max_file_handles() == 30
+            assert man.num_file_handles() <= 30
+
+            # a shard under pressure takes the unused limits of the other shards
+            shard = man.shard_for(fcs[0].path)
+            assert man.collect() and man.mapped_memory_size() == 0
+            others = sum(s.max_mapped_memory_size() for s in man.shards() if s is not shard)
+            before = shard.max_mapped_memory_size()
+            man._rebalance(shard, before + 4096)
+            assert shard.max_mapped_memory_size() == before + 4096
+            assert man.max_mapped_memory_size() == before + others
+        finally:
+            for fc in fcs:
+                fc.__del__()
+        # END cleanup
+
+    def test_advice(self):
+        with FileCreator(self.k_window_test_size, "advice_test") as fc:
+            winsize = align_to_mmap(fc.size // 10, True)
+            man = SlidingWindowMapManager(window_size=winsize, max_memory_size=winsize * 2)
+            c = man.make_cursor(fc.path, advice=MADV_RANDOM)
+            assert c.advice() == MADV_RANDOM
+            assert copy(c).advice() == MADV_RANDOM
+
+            # the cursor's hint is applied to the regions it uses
+            assert c.use_region(0, 1).is_valid()
+            assert c.region().advice() == MADV_RANDOM
+
+            # hints given explicitly override it
+            assert c.use_region(winsize * 2, 1, advice=MADV_SEQUENTIAL).is_valid()
+            assert c.region().advice() == MADV_SEQUENTIAL
+            assert c.use_region(winsize * 2 + 1, 1, advice=MADV_RANDOM).is_valid()
+            assert c.region().advice() == MADV_RANDOM
+
+            # evicting regions works with and without hints being supported
+            for i in range(3, 8):
+                assert c.use_region(winsize * i, 1).is_valid()
+            c.unuse_region()
+            assert man.mapped_memory_size() <= man.max_mapped_memory_size()
+            assert man.collect() and man.num_file_handles() == 0
+
+    def test_readinto(self):
+        with FileCreator(self.k_window_test_size, "readinto_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+            man = SlidingWindowMapManager(window_size=fc.size // 10, max_memory_size=fc.size // 4)
+            c = man.make_cursor(fc.path)
+
+            # within a window
+            buf = bytearray(100)
+            assert c.readinto(1000, buf) == 100
+            assert buf == data[1000:1100]
+
+            # spanning all windows
+            buf = bytearray(fc.size)
+            assert c.readinto(0, buf) == fc.size
+            assert buf == data
+            assert man.mapped_memory_size() <= man.max_mapped_memory_size()
+
+            # into a memoryview of another format, limited by the end of the file
+            buf = memoryview(bytearray(16)).cast('I')
+            assert c.readinto(fc.size - 10, buf) == 10
+            assert buf.tobytes()[:10] == data[-10:]
+
+            # nothing to read beyond the end
+            assert c.readinto(fc.size, bytearray(10)) == 0
+            self.assertRaises(TypeError, c.readinto, 0, b'readonly')
+
+    def test_search(self):
+        rand = Random(5)
+        winsize = align_to_mmap(1, True) * 4
+        data = bytearray(rand.getrandbits(8) for _ in range(winsize * 10 + 123))
+        data = data.replace(b'M', b'm')
+        # markers within windows, at their start and end, and spanning them
+        for ofs in (5, winsize - 3, winsize * 2, winsize * 3 - 6, winsize * 5 - 1, len(data) - 6):
+            data[ofs:ofs + 6] = b"MARKER"
+        # END for each marker
+        data = bytes(data)
+        with tempfile.NamedTemporaryFile("wb", prefix="search_test", delete=False) as file:
+            file.write(data)
+        try:
+            for man in (StaticWindowMapManager(),
+                        SlidingWindowMapManager(window_size=winsize, max_memory_size=winsize * 3),
+                        SlidingWindowMapManager(window_size=3, max_memory_size=winsize * 3)):
+                c = man.make_cursor(file.name)
+                for sub in (b"MARKER", b"M", b"RK", b"not there", b""):
+                    for start, end in ((0, None), (6, len(data) - 1), (winsize, winsize * 3 - 1),
+                                       (winsize * 3 - 2, winsize * 3 + 3), (len(data), None)):
+                        send = len(data) if end is None else end
+                        assert c.find(sub, start, end) == data.find(sub, start, send), (sub, start, end)
+                        assert c.rfind(sub, start, end) == data.rfind(sub, start, send), (sub, start, end)
+                        assert c.count(sub, start, end) == data.count(sub, start, send), (sub, start, end)
+                    # END for each range
+                # END for each needle
+
+                for pattern in (b"MAR+KER", re.compile(b"M[A-Z]+"), b"[0-9]{2,}"):
+                    regex = re.compile(pattern) if isinstance(pattern, bytes) else pattern
+                    expected = [(m.start(), m.group()) for m in regex.finditer(data)]
+                    assert [(ofs, m.group()) for ofs, m in c.finditer(pattern, overlap=16)] == expected
+                # END for each pattern
+                assert [ofs for ofs, m in c.finditer(b"MARKER", winsize, winsize * 3 - 1)] == [winsize * 2]
+                c.unuse_region()
+                assert man.collect()
+            # END for each manager
+        finally:
+            os.remove(file.name)
+
+    def test_read_many(self):
+        with FileCreator(self.k_window_test_size, "read_many_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+            rand = Random(3)
+            ranges = [(rand.randint(0, fc.size - 1), rand.randint(0, 5000)) for _ in range(500)]
+            ranges += [(0, 10), (fc.size - 5, 10), (fc.size, 10), (100, 0), (0, fc.size)]
+            expected = [data[ofs:ofs + size] for ofs, size in ranges]
+
+            for man in (StaticWindowMapManager(),
+                        SlidingWindowMapManager(window_size=fc.size // 10, max_memory_size=fc.size // 4)):
+                c = man.make_cursor(fc.path)
+                assert c.read(10, 10) == data[10:20]
+                assert c.read(fc.size - 2, 10) == data[-2:]
+                assert c.read(fc.size, 10) == b''
+
+                assert c.read_many(ranges) == expected
+                assert c.read_many([]) == []
+                assert man.mapped_memory_size() <= max(man.max_mapped_memory_size(), fc.size)
+                c.unuse_region()
+            # END for each manager
+
+            # each window is mapped only once if it can stay mapped
+            man = SlidingWindowMapManager(window_size=fc.size // 10)
+            c = man.make_cursor(fc.path)
+            assert c.read_many(ranges[:500]) == expected[:500]
+            assert man.num_file_handles() <= 11
+
+    def test_file_growth(self):
+        winsize = align_to_mmap(1, True) * 4
+        data = bytes(Random(7).getrandbits(8) for _ in range(winsize * 2 + 100))
+        with tempfile.NamedTemporaryFile("wb", prefix="growth_test", delete=False) as file:
+            file.write(data)
+        try:
+            for mtype, args in ((StaticWindowMapManager, (0,)), (SlidingWindowMapManager, (winsize,))):
+                # without growth tracking, appended data is not visible
+                man = mtype(*args)
+                c = man.make_cursor(file.name)
+                assert c.use_region(len(data) - 1, 1).is_valid()
+                with open(file.name, 'ab') as fp:
+                    fp.write(data)
+                assert not c.use_region(len(data), 1).is_valid()
+                assert c.file_size() == len(data)
+
+                # unless the size is refreshed explicitly
+                assert c.refresh_file_size() == len(data) * 2
+                assert c.read(len(data) - 10, 20) == (data + data)[len(data) - 10:len(data) + 10]
+                c.unuse_region()
+                with open(file.name, 'wb') as fp:
+                    fp.write(data)
+
+                # with growth tracking, reading beyond the end checks the size again
+                man = mtype(*args, track_growth=True)
+                c = man.make_cursor(file.name)
+                assert c.use_region(len(data) - 1, 1).is_valid()
+                last = c.region()
+                c.unuse_region()
+                assert not c.use_region(len(data), 1).is_valid()
+                with open(file.name, 'ab') as fp:
+                    fp.write(data)
+                assert c.use_region(len(data), 1).is_valid()
+                assert c.file_size() == len(data) * 2
+                assert c.read(0, len(data) * 2) == data + data
+
+                # the unused region at the former end of the file was replaced by a larger one
+                assert last not in c._rlist
+                assert last.client_count() == 0
+                assert man.mapped_memory_size() == sum(r.size() for r in c._rlist)
+
+                # regions still in use at the former end are replaced, but stay mapped until they are released
+                with open(file.name, 'ab') as fp:
+                    fp.write(data)
+                assert c.use_region(len(data) * 2 - 1, 1).is_valid()
+                last = c.region()
+                c2 = man.make_cursor(file.name)
+                assert c2.read(len(data) * 2 - 10, 20) == (data + data)[-10:] + data[:10]
+                assert last not in c._rlist and c.region() is last
+                assert last.client_count() == 2
+                assert c2.read(0, len(data) * 3) == data * 3
+                starts = [r.ofs_begin() for r in c._rlist]
+                assert starts == sorted(set(starts))
+                assert all(r.ofs_end() <= n.ofs_begin() for r, n in zip(c._rlist, c._rlist[1:]))
+                c.unuse_region()
+                assert last.client_count() == 0
+                assert man.mapped_memory_size() == sum(r.size() for r in c._rlist)
+                c2.unuse_region()
+                assert man.collect() and man.num_file_handles() == 0
+
+                # the same applies to regions smaller than a page
+                with open(file.name, 'wb') as fp:
+                    fp.write(data[:100])
+                man = mtype(*args, track_growth=True)
+                c = man.make_cursor(file.name)
+                assert c.use_region(0, 1).is_valid()
+                with open(file.name, 'ab') as fp:
+                    fp.write(data[:5000])
+                c2 = man.make_cursor(file.name)
+                assert c2.read(200, 10) == (data[:100] + data)[200:210]
+                assert c2.region() is not c.region()
+                c2.unuse_region()
+                assert man.collect() == 1
+                assert man.num_file_handles() == 1
+                c.unuse_region()
+                assert man.num_file_handles() == 0 and man.mapped_memory_size() == 0
+                assert man.num_open_files() == 0
+                with open(file.name, 'wb') as fp:
+                    fp.write(data)
+            # END for each manager type
+        finally:
+            os.remove(file.name)
+
+    def test_fd_pool(self):
+        fcs = [FileCreator(self.k_window_test_size, "fd_pool_test_%i" % i) for i in range(3)]
+        try:
+            size = fcs[0].size
+            man = SlidingWindowMapManager(window_size=size // 10, max_pooled_fds=2)
+            assert man.num_pooled_file_handles() == 0
+
+            # all windows of a file are mapped using the same file descriptor
+            c = man.make_cursor(fcs[0].path)
+            assert c.use_region(0, 1).is_valid()
+            fd = c._rlist._fd
+            assert fd is not None
+            assert c.use_region(size // 2, 1).is_valid()
+            assert c._rlist._fd == fd
+            assert man.num_pooled_file_handles() == 1
+            assert man.num_file_handles() == 2
+            assert c.refresh_file_size() == size
+
+            # the pool is limited, the least recently used file is closed
+            cursors = [man.make_cursor(fc.path) for fc in fcs[1:]]
+            for oc in cursors:
+                assert oc.use_region(0, 1).is_valid()
+            assert man.num_pooled_file_handles() == 2
+            assert c._rlist._fd is None
+            assert c.use_region(size - 1, 1).is_valid()
+            assert c._rlist._fd is not None and cursors[0]._rlist._fd is None
+            assert c.read(0, size) == cursors[1].read(0, size)
+
+            # files are closed once none of their windows is mapped anymore
+            for oc in cursors + [c]:
+                oc.unuse_region()
+            assert man.collect()
+            assert man.num_pooled_file_handles() == 0 and man.num_file_handles() == 0
+
+            # pooled file descriptors count against the handle limit
+            man = SlidingWindowMapManager(window_size=size // 10, max_open_handles=4, max_pooled_fds=1)
+            c = man.make_cursor(fcs[0].path)
+            for i in range(10):
+                assert c.use_region(i * (size // 10), 1).is_valid()
+                assert man.num_file_handles() + man.num_pooled_file_handles() <= 4
+            # END for each window
+
+            # pooled files are closed once the manager is gone, even if windows are still mapped
+            rlist = c._rlist
+            assert rlist._fd is not None
+            del man, c
+            gc.collect()
+            assert rlist._fd is None
+
+            # managers which handed out pooled cursors are collected as well
+            man = SlidingWindowMapManager(window_size=size // 10, max_pooled_fds=1)
+            with man.acquire_cursor(fcs[0].path) as pc:
+                assert pc.use_region(0, 10).is_valid()
+                rlist = pc._rlist
+            # END with cursor
+            assert rlist._fd is not None
+            man_ref = weakref.ref(man)
+            del man, pc
+            gc.collect()
+            assert man_ref() is None and rlist._fd is None
+
+            man = ShardedWindowMapManager(2, window_size=size // 10)
+            with man.acquire_cursor(fcs[0].path) as pc:
+                assert pc.use_region(0, 10).is_valid()
+            # END with cursor
+            shard_ref = weakref.ref(man.shard_for(fcs[0].path))
+            del man, pc
+            gc.collect()
+            assert shard_ref() is None
+
+            # pooling is disabled by default
+            man = SlidingWindowMapManager(window_size=size // 10)
+            c = man.make_cursor(fcs[0].path)
+            assert c.use_region(0, 1).is_valid()
+            assert man.num_pooled_file_handles() == 0 and c._rlist._fd is None
+        finally:
+            for fc in fcs:
+                fc.__del__()
+        # END cleanup
+
+    def test_write(self):
+        with FileCreator(self.k_window_test_size, "write_test") as fc:
+            size = fc.size
+            for man in (StaticWindowMapManager(), SlidingWindowMapManager(window_size=size // 10)):
+                # read-only files cannot be written
+                c = man.make_cursor(fc.path)
+                assert c.access() == ACCESS_READ
+                self.assertRaises(ValueError, c.write, 0, b'x')
+
+                # files mapped for writing use their own regions
+                w = man.make_cursor(fc.path, access=ACCESS_WRITE)
+                assert w.access() == ACCESS_WRITE
+                assert w._rlist is not c._rlist
+                data = bytes(range(256)) * 4
+                ofs = size // 10 - 100    # spans windows of the sliding manager
+                assert w.write(ofs, data) == len(data)
+                assert man.dirty_memory_size() == len(data)
+                assert w.read(ofs, len(data)) == data
+                # shared mappings are visible to readers right away
+                assert c.read(ofs, len(data)) == data
+
+                assert w.flush() > 0
+                assert man.dirty_memory_size() == 0 and w.flush() == 0
+                with open(fc.path, 'rb') as fp:
+                    fp.seek(ofs)
+                    assert fp.read(len(data)) == data
+                # END verify file
+
+                # writes are clamped to the end of the file
+                assert w.write(size - 2, b'abcd') == 2
+                assert w.read(size - 2, 4) == b'ab'
+
+                # writes through the buffer have to be marked
+                assert w.use_region(0, 4).is_valid()
+                w.buffer()[:4] = b'head'
+                w.mark_dirty()
+                assert man.dirty_memory_size() > 0
+                w.unuse_region()
+                # changes are written once the regions are unmapped
+                assert man.collect()
+                assert man.dirty_memory_size() == 0
+                with open(fc.path, 'rb') as fp:
+                    assert fp.read(4) == b'head'
+                # END verify file
+
+                # copy-on-write mappings don't change the file
+                cp = man.make_cursor(fc.path, access=ACCESS_COPY)
+                assert cp.write(0, b'copy') == 4
+                assert cp.read(0, 4) == b'copy'
+                assert man.dirty_memory_size() == 0
+                assert c.read(0, 4) == b'head'
+                del cp, c, w
+            # END for each manager
+
+            # dirty regions are flushed in batches once the limit is exceeded
+            man = SlidingWindowMapManager(window_size=size // 10, max_dirty_size=4096)
+            assert man.max_dirty_memory_size() == 4096
+            w = man.make_cursor(fc.path, access=ACCESS_WRITE)
+            w.write(0, b'1' * 4000)
+            assert man.dirty_memory_size() == 4000
+            w.write(size // 2, b'2' * 200)
+            assert man.dirty_memory_size() == 0
+            with open(fc.path, 'rb') as fp:
+                fp.seek(size // 2)
+                assert fp.read(200) == b'2' * 200
+            # END verify file
+
+    def test_huge_pages(self):
+        with FileCreator(self.k_window_test_size, "huge_page_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+            # END get data
+            size = fc.size
+            man = SlidingWindowMapManager(window_size=size // 5, huge_pages=True, prefault=True)
+            assert man.uses_huge_pages() and man.prefaults()
+            assert man.window_size() % HUGE_PAGE_SIZE == 0
+            assert not SlidingWindowMapManager().uses_huge_pages()
+
+            c = man.make_cursor(fc.path)
+            for ofs in (size // 2, 100, size - 1, HUGE_PAGE_SIZE + 5):
+                assert c.use_region(ofs, 1).is_valid()
+                assert c.region().ofs_begin() % HUGE_PAGE_SIZE == 0
+                assert c.read(ofs, 1000) == data[ofs:ofs + 1000]
+            # END for each offset
+            assert c.read(0, size) == data
+
+            # static managers map the whole file
+            man = StaticWindowMapManager(huge_pages=True, prefault=True)
+            c = man.make_cursor(fc.path)
+            assert c.use_region().is_valid() and c.size() == size
+            assert c.read(0, size) == data
+
+    def test_stats(self):
+        with FileCreator(self.k_window_test_size, "stats_test") as fc:
+            size = fc.size
+            man = SlidingWindowMapManager(window_size=size // 10, max_memory_size=size // 2)
+            stats = man.stats()
+            assert stats['hits'] == stats['maps'] == stats['evictions'] == 0
+            assert stats['open_files'] == 0 and 'files' not in stats
+
+            c = man.make_cursor(fc.path)
+            for ofs in (0, size // 2, 0, size // 2):
+                assert c.use_region(ofs, 1).is_valid()
+            # END for each offset
+            stats = man.stats()
+            assert stats['maps'] == 2 and stats['hits'] == 2
+            assert stats['mapped_memory_size'] == man.mapped_memory_size()
+            assert stats['open_files'] == man.num_open_files() == 1
+            assert stats['file_handles'] == man.num_file_handles()
+
+            # scanning the file requires evictions
+            ofs = 0
+            while c.use_region(ofs, size).is_valid():
+                ofs = c.ofs_end()
+            # END while scanning
+            stats = man.stats(per_file=True)
+            assert stats['evictions'] > 0 and stats['collections'] > 0
+            assert man.mapped_memory_size() <= stats['peak_mapped_memory_size'] <= size // 2
+            fstats = stats['files'][fc.path]
+            assert fstats['maps'] == stats['maps'] and fstats['evictions'] == stats['evictions']
+            assert fstats['regions'] == man.num_file_handles()
+            assert fstats['mapped_memory_size'] == man.mapped_memory_size()
+
+            c.unuse_region()
+            assert man.collect()
+            assert man.num_open_files() == 0 and man.stats()['map_retries'] == 0
+
+            # sharded managers sum up the stats of their shards
+            man = ShardedWindowMapManager(num_shards=2, window_size=size // 10)
+            c = man.make_cursor(fc.path)
+            assert c.use_region(0, 1).is_valid()
+            stats = man.stats(per_file=True)
+            assert stats['maps'] == 1 and stats['open_files'] == 1
+            assert stats['files'][fc.path]['regions'] == 1
+
+    def test_adaptive_windows(self):
+        with FileCreator(self.k_window_test_size, "adaptive_test") as fc:
+            size = fc.size
+            window_size = align_to_mmap(size // 32, True)
+            bounds = (window_size // 4, window_size * 8)
+            man = SlidingWindowMapManager()
+            assert man.make_cursor(fc.path).window_size() == man.window_size()
+
+            # sequential readers get larger windows
+            man = SlidingWindowMapManager(window_size=window_size, window_size_bounds=bounds)
+            c = man.make_cursor(fc.path)
+            assert c.window_size() == window_size
+            chunk = bytearray(window_size // 3)
+            for _ in range(4):
+                ofs = 0
+                while c.readinto(ofs, chunk):
+                    ofs += len(chunk)
+                # END while reading
+                c.unuse_region()
+                man.collect()
+            # END for each scan
+            assert window_size < c.window_size() <= bounds[1]
+            assert man.stats(per_file=True)['files'][fc.path]['window_size'] == c.window_size()
+            assert c.use_region(0, size).is_valid() and c.size() == c.window_size()
+
+            # files accessed at random get smaller windows, other files are not affected
+            man = SlidingWindowMapManager(window_size=window_size, max_memory_size=window_size * 2,
+                                          window_size_bounds=bounds)
+            c = man.make_cursor(fc.path)
+            rand = Random(5)
+            for _ in range(200):
+                assert c.use_region(rand.randint(0, size - 1), 1).is_valid()
+            # END for each access
+            assert bounds[0] <= c.window_size() < window_size
+            assert c.region().size() < window_size
+            with FileCreator(size, "adaptive_test_other") as ofc:
+                assert man.make_cursor(ofc.path).window_size() == window_size
+            # END handle other file
+
+    def test_compact(self):
+        with FileCreator(self.k_window_test_size, "compact_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+            # END get data
+            window_size = align_to_mmap(fc.size // 40, True)
+            man = SlidingWindowMapManager(window_size=window_size)
+            c = man.make_cursor(fc.path)
+            for i in range(8):
+                assert c.use_region(i * window_size, 1).is_valid()
+            # END map adjacent windows
+            held = man.make_cursor(fc.path)
+            assert held.use_region(5 * window_size, 1).is_valid()
+            held_region = held.region()
+            c.unuse_region()
+            assert man.num_file_handles() == 8
+
+            # nothing fits into a window
+            assert man.compact() == 0
+
+            # as if the window size grew, adjacent unused regions are merged, but the used one is kept
+            man._window_size = window_size * 4
+            assert man.compact() == 4
+            assert man.num_file_handles() == 4
+            rlist = c._rlist
+            assert [r.size() for r in rlist] == [window_size * 4, window_size, window_size, window_size * 2]
+            assert rlist[2] is held_region and held.region() is held_region
+            assert all(rlist[i].ofs_end() == rlist[i + 1].ofs_begin() for i in range(len(rlist) - 1))
+            assert man.mapped_memory_size() == window_size * 8
+            assert man.compact() == 0
+
+            # data is still available, and new regions are found
+            assert held.read(5 * window_size, 100) == data[5 * window_size:5 * window_size + 100]
+            assert c.read(0, window_size * 8) == data[:window_size * 8]
+            assert c.use_region(window_size, 1).region() is rlist[0]
+
+            # files mapped copy on write are not compacted, to keep their changes
+            cp = man.make_cursor(fc.path, access=ACCESS_COPY)
+            for i in range(2):
+                assert cp.use_region(i * window_size * 4, 1).is_valid()
+            cp.unuse_region()
+            man._window_size = window_size * 8
+            before = len(cp._rlist)
+            man.compact()
+            assert len(cp._rlist) == before
+
+            # once the handle limit is reached, regions are merged before unmapping them
+            man = SlidingWindowMapManager(window_size=window_size, max_open_handles=5, max_pooled_fds=0)
+            c = man.make_cursor(fc.path)
+            for i in range(5):
+                assert c.use_region(i * window_size, 1).is_valid()
+            # END map adjacent windows
+            c.unuse_region()
+            man._window_size = window_size * 4
+            assert c.use_region(window_size * 10, 1).is_valid()
+            assert man.num_file_handles() == 3
+            assert man.stats()['evictions'] == 0
+            # only the run next to the new region is merged
+            assert [r.size() for r in c._rlist[:2]] == [window_size, window_size * 4]
+
+            # runs elsewhere in the file are left alone, without having to look at them
+            man = SlidingWindowMapManager(window_size=window_size, max_open_handles=5, max_pooled_fds=0)
+            c = man.make_cursor(fc.path)
+            for i in (0, 1, 4, 8, 9):
+                assert c.use_region(i * window_size, 1).is_valid()
+            # END map windows
+            c.unuse_region()
+            rlist = c._rlist
+            far = rlist[:3]
+            run_bounds = (rlist[3].ofs_begin(), rlist[4].ofs_end())
+            man._window_size = window_size * 4
+            assert c.use_region(window_size * 12, 1).is_valid()
+            assert man.stats()['evictions'] == 0
+            assert len(rlist) == 5 and man.num_file_handles() == 5
+            assert rlist[:3] == far
+            assert (rlist[3].ofs_begin(), rlist[3].ofs_end()) == run_bounds
+            c.release()
+
+    def test_cursor_lifetime(self):
+        with FileCreator(self.k_window_test_size, "cursor_lifetime_test") as fc:
+            man = SlidingWindowMapManager(window_size=fc.size // 10)
+            assert not hasattr(WindowCursor, '__del__')
+
+            # cloning shares the regions list and uses the current region only
+            c = man.make_cursor(fc.path)
+            assert c.use_region(0, 1).is_valid()
+            assert man.make_cursor(fc.path).use_region(fc.size // 2, 1).is_valid()
+            region = c.region()
+            assert region.client_count() == 2
+            cc = copy(c)
+            assert cc._rlist is c._rlist and cc.region() is region
+            assert region.client_count() == 3
+            assert cc.use_region(fc.size - 1, 1).is_valid() and cc.path() == fc.path
+            assert region.client_count() == 2
+
+            # unreleased cursors release their region once collected, even within reference cycles
+            cycle = man.make_cursor(fc.path)
+            assert cycle.use_region(0, 1).region() is region
+            holder = [cycle]
+            holder.append(holder)
+            del cycle, holder
+            gc.collect()
+            assert region.client_count() == 2
+            del cc
+            c.release()
+            assert region.client_count() == 1
+
+            # pooled cursors are reused once released
+            with man.acquire_cursor(fc.path) as pc:
+                assert pc.is_associated() and pc.use_region(0, 1).region() is region
+                assert region.client_count() == 2
+            # END with cursor
+            assert region.client_count() == 1
+            assert not pc.is_associated()
+            other = man.acquire_cursor(fc.path)
+            assert other is pc and not other.is_valid()
+            assert len(other.read(0, 10)) == 10
+            other.release()
+
+            # releasing a cursor twice returns it only once, so it is never handed out twice
+            other.release()
+            assert man._cursor_pool.count(other) == 1
+            a, b = man.acquire_cursor(fc.path), man.acquire_cursor(fc.path)
+            assert a is other and a is not b
+            b.release()
+            a.release()
+
+            # a cursor dropped without releasing it isn't returned, but its region is released
+            lost = man.acquire_cursor(fc.path)
+            assert lost is pc
+            lost.use_region(0, 1)
+            assert region.client_count() == 2
+            del lost, pc, other, a, b
+            assert region.client_count() == 1
+            assert man.acquire_cursor(fc.path) is not None
+
+            # the size of the pool is limited
+            class SmallPoolManager(SlidingWindowMapManager):
+                __slots__ = tuple()
+                max_pooled_cursors = 2
+            # END small pool manager
+            man = SmallPoolManager()
+            cursors = [man.acquire_cursor(fc.path) for _ in range(4)]
+            for pc in cursors:
+                pc.release()
+            assert len(man._cursor_pool) == 2
+
+    def test_file_view(self):
+        with FileCreator(self.k_window_test_size, "file_view_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+            # END get data
+
+            man = StaticWindowMapManager()
+            c = man.make_cursor(fc.path)
+            view = c.file_view()
+            assert view.readonly and len(view) == fc.size
+            assert view[100:200] == data[100:200]
+            # the view is cached and keeps the region in use
+            assert c.file_view() is view
+            region = c.region()
+            assert region.client_count() == 2
+            assert man.make_cursor(fc.path).file_view() is view
+            c.release()
+            assert man.collect() == 1
+            # the cached view was released together with the region
+            self.assertRaises(ValueError, len, view)
+
+            # slices outliving the region keep its memory alive, without disturbing the manager
+            c = man.make_cursor(fc.path)
+            chunk = c.file_view()[:10]
+            c.release()
+            assert man.collect() == 1
+            assert man.num_file_handles() == 0
+            assert chunk == data[:10]
+            del chunk
+
+            # views still exported to others don't keep the region from being collected
+            c = man.make_cursor(fc.path)
+            words = struct.iter_unpack('<I', c.file_view()[:8])
+            view_bytes = struct.iter_unpack('B', c.file_view())
+            c.release()
+            assert man.collect() == 1
+            assert man.num_file_handles() == 0 and man.mapped_memory_size() == 0
+            assert next(view_bytes) == (data[0],)
+            assert next(words) == struct.unpack_from('<I', data)
+            del words, view_bytes
+
+            # empty files have empty views
+            empty = os.path.join(os.path.dirname(fc.path), "file_view_empty")
+            open(empty, 'wb').close()
+            try:
+                assert len(man.make_cursor(empty).file_view()) == 0
+            finally:
+                os.remove(empty)
+            # END remove empty file
+
+            # windows smaller than the file can't provide a view of it
+            man = SlidingWindowMapManager(window_size=fc.size // 10)
+            c = man.make_cursor(fc.path)
+            self.assertRaises(ValueError, c.file_view)
+            c.release()
+
+    @skipIf(numpy is None, "requires numpy")
+    def test_as_array(self):
+        with FileCreator(self.k_window_test_size, "as_array_test") as fc:
+            data = os.urandom(fc.size)
+            with open(fc.path, 'wb') as fp:
+                fp.write(data)
+            # END fill file
+            window_size = align_to_mmap(fc.size // 10, True)
+            man = SlidingWindowMapManager(window_size=window_size)
+            c = man.make_cursor(fc.path)
+
+            # within a window, arrays view the mapped memory
+            arr = c.as_array(8, '<u4', 100)
+            assert arr.dtype == numpy.dtype('<u4') and len(arr) == 100
+            assert not arr.flags.writeable
+            assert (arr == numpy.frombuffer(data, '<u4', 100, 8)).all()
+            region = c.region()
+            assert region.client_count() == 3
+
+            # the array keeps its region mapped after the cursor is gone
+            c.release()
+            assert man.collect() == 0
+            assert region.client_count() == 2
+            del arr
+            gc.collect()
+            assert region.client_count() == 1
+            assert man.collect() == 1
+
+            # ranges spanning windows are copied
+            c = man.make_cursor(fc.path)
+            assert c.use_region(0, 1).region().size() == window_size
+            arr = c.as_array(window_size - 8, '>u8', 4)
+            assert arr.flags.writeable
+            assert (arr == numpy.frombuffer(data, '>u8', 4, window_size - 8)).all()
+
+            # the remainder of the file
+            ofs = fc.size - 10
+            assert len(c.as_array(ofs, 'u2')) == 5
+            assert len(c.as_array(fc.size, 'u1')) == 0
+            self.assertRaises(ValueError, c.as_array, ofs, 'u4', 3)
+            self.assertRaises(ValueError, c.as_array, -1, 'u1', 1)
+            c.release()
+
+    @skipIf(numpy is not None, "numpy is available")
+    def test_as_array_without_numpy(self):
+        with FileCreator(self.k_window_test_size, "as_array_test") as fc:
+            c = StaticWindowMapManager().make_cursor(fc.path)
+            self.assertRaises(ImportError, c.as_array, 0, 'u1', 1)
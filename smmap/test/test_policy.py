@@ -0,0 +1,163 @@
+from .lib import TestBase, FileCreator
+
+from smmap.mman import SlidingWindowMapManager
+from smmap.policy import (
+    LRUPolicy,
+    LFUPolicy,
+    ClockPolicy,
+    TwoQueuePolicy
+)
+from smmap.util import (
+    MapRegionList,
+    align_to_mmap
+)
+
+
+class _Region:
+
+    """Stands in for a MapRegion, providing only what policies use"""
+
+    def __init__(self, ofs):
+        self._b = ofs
+        self._uc = 1
+        self._hits = 0
+        self._tick = 0
+
+
+class TestPolicy(TestBase):
+
+    def _use(self, policy, regions, region, times=1):
+        for _ in range(times):
+            region._uc += 1
+            policy.acquire(region)
+            region._uc -= 1
+            if region._uc == 1:
+                policy.release(region, regions)
+        # END for each use
+
+    def _evict_all(self, policy):
+        res = list()
+        item = policy.evict()
+        while item is not None:
+            res.append(item[0])
+            item = policy.evict()
+        return res
+
+    def test_policies(self):
+        regions = MapRegionList("some_path")
+        for policy_type in (LRUPolicy, LFUPolicy, ClockPolicy, TwoQueuePolicy):
+            policy = policy_type()
+            assert len(policy) == 0
+            assert policy.evict() is None
+
+            items = [_Region(i) for i in range(4)]
+            for r in items:
+                policy.insert(r, regions)
+            # END for each region
+            assert len(policy) == 4
+
+            # used regions are never evicted
+            items[0]._uc += 1
+            policy.acquire(items[0])
+            assert items[0]._hits == 1
+            assert items[0]._tick > 0
+            assert len(policy) == 3
+            evicted = self._evict_all(policy)
+            assert items[0] not in evicted and len(evicted) == 3
+            assert len(policy) == 0
+
+            # once it is released, it may be evicted
+            items[0]._uc -= 1
+            policy.release(items[0], regions)
+            assert len(policy) == 1
+            assert policy.evict() == (items[0], regions)
+
+            # touching records an access, but the region stays a candidate for eviction
+            a, b = _Region(10), _Region(11)
+            policy.insert(a, regions)
+            policy.insert(b, regions)
+            policy.touch(a, regions)
+            assert a._hits == 1 and a._tick > items[0]._tick
+            assert len(policy) == 2
+            assert self._evict_all(policy) == [b, a]
+        # END for each policy type
+
+    def test_order(self):
+        regions = MapRegionList("some_path")
+
+        # LRU evicts the region released first
+        policy = LRUPolicy()
+        a, b, c = [_Region(i) for i in range(3)]
+        for r in (a, b, c):
+            policy.insert(r, regions)
+        self._use(policy, regions, a)
+        assert self._evict_all(policy) == [b, c, a]
+
+        # LFU evicts the region used least often
+        policy = LFUPolicy()
+        a, b, c = [_Region(i) for i in range(3)]
+        for r in (a, b, c):
+            policy.insert(r, regions)
+        self._use(policy, regions, a, 3)
+        self._use(policy, regions, b, 2)
+        self._use(policy, regions, c, 1)
+        assert self._evict_all(policy) == [c, b, a]
+
+        # many uses don't accumulate outdated entries
+        self._use(policy, regions, a, 1000)
+        assert len(policy._heap) < 1000
+        assert self._evict_all(policy) == [a]
+
+        # CLOCK gives referenced regions a second chance
+        policy = ClockPolicy()
+        a, b, c = [_Region(i) for i in range(3)]
+        for r in (a, b, c):
+            policy.insert(r, regions)
+        self._use(policy, regions, a)
+        assert self._evict_all(policy) == [b, c, a]
+
+        # 2Q evicts regions used once before the ones used frequently
+        policy = TwoQueuePolicy()
+        hot = [_Region(i) for i in range(2)]
+        scan = [_Region(i) for i in range(10, 20)]
+        for r in hot:
+            policy.insert(r, regions)
+            self._use(policy, regions, r, 3)
+        for r in scan:
+            policy.insert(r, regions)
+            self._use(policy, regions, r)
+        # END for each scanned region
+        evicted = [policy.evict()[0] for _ in range(len(scan))]
+        assert evicted == scan
+        assert self._evict_all(policy) == hot
+
+        # positions evicted recently are considered frequently used once mapped again
+        r = _Region(10)
+        policy.insert(r, regions)
+        self._use(policy, regions, r)
+        assert r in policy._am
+
+    def test_scan_resistance(self):
+        with FileCreator(self.k_window_test_size, "policy_test") as fc:
+            winsize = align_to_mmap(fc.size // 20, True)
+            man = SlidingWindowMapManager(window_size=winsize, max_memory_size=winsize * 6,
+                                          policy=TwoQueuePolicy())
+            c = man.make_cursor(fc.path)
+
+            # make the first window hot
+            for _ in range(5):
+                assert c.use_region(0, 1).is_valid()
+                hot = c.region()
+                c.unuse_region()
+            # END for each access
+
+            # scan through the whole file, which requires a lot of regions to be unmapped
+            ofs = winsize
+            while c.use_region(ofs, winsize).is_valid():
+                ofs = c.ofs_end()
+            # END while scanning
+            assert man.mapped_memory_size() <= man.max_mapped_memory_size()
+
+            # the hot window survived
+            assert hot in c._rlist
+            assert c.use_region(0, 1).region() is hot
@@ -0,0 +1,48 @@
+from .lib import TestBase, FileCreator
+
+from smmap.mman import SlidingWindowMapManager
+from smmap.buf import SlidingWindowMapBuffer
+from smmap.util import align_to_mmap
+
+
+class TestPrefetch(TestBase):
+
+    def test_prefetch(self):
+        with FileCreator(self.k_window_test_size, "prefetch_test") as fc:
+            with open(fc.path, 'rb') as fp:
+                data = fp.read()
+            winsize = align_to_mmap(fc.size // 10, True)
+
+            assert SlidingWindowMapManager().prefetcher() is None
+            man = SlidingWindowMapManager(window_size=winsize, prefetch=True)
+            assert man.is_thread_safe()
+            pf = man.prefetcher()
+            assert pf is not None
+
+            # random access doesn't prefetch anything
+            c = man.make_cursor(fc.path)
+            assert c.use_region(winsize * 5, 1).is_valid()
+            assert c.use_region(winsize * 2, 1).is_valid()
+            pf.wait()
+            assert man.num_file_handles() == 2
+
+            # moving to the next window maps the following one in the background
+            assert c.use_region(winsize * 3, 1).is_valid()
+            pf.wait()
+            assert man.num_file_handles() == 4
+            prefetched = [r for r in c._rlist if r.includes_ofs(winsize * 4)]
+            assert len(prefetched) == 1 and prefetched[0].client_count() == 1
+
+            # once we get there, it is used right away
+            assert c.use_region(winsize * 4, 1).is_valid()
+            assert c.region() is prefetched[0]
+            pf.wait()
+            c.unuse_region()
+
+            # a sequential read through a buffer sees the correct data, and doesn't prefetch beyond the file
+            buf = SlidingWindowMapBuffer(man.make_cursor(fc.path))
+            assert buf[:] == data
+            pf.wait()
+            buf.end_access()
+            assert all(r.ofs_end() <= fc.size for r in c._rlist)
+            assert man.collect() and man.num_file_handles() == 0
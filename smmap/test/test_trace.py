@@ -0,0 +1,103 @@
+from .lib import TestBase, FileCreator
+
+from smmap.mman import SlidingWindowMapManager, ShardedWindowMapManager
+from smmap.trace import (
+    page_faults,
+    Probe,
+    Tracer,
+    LatencyHistogram,
+    HistogramTracer
+)
+
+
+class _RecordingTracer(Tracer):
+
+    """Keeps all calls it receives"""
+    __slots__ = ('calls',)
+
+    def __init__(self):
+        self.calls = list()
+
+    def mapped(self, region, regions, seconds, faults):
+        self.calls.append(('map', region.ofs_begin(), seconds, faults))
+
+    def unmapped(self, region, regions, seconds, faults):
+        self.calls.append(('unmap', region.ofs_begin(), seconds, faults))
+
+    def read(self, regions, offset, size, seconds, faults):
+        self.calls.append(('read', offset, size, seconds, faults))
+
+
+class TestTrace(TestBase):
+
+    def test_histogram(self):
+        hist = LatencyHistogram()
+        assert hist.count() == 0 and hist.percentile(99) == 0.0
+        for _ in range(98):
+            hist.record(0.000003)
+        hist.record(0.001)
+        hist.record(0.5)
+        assert hist.count() == 100
+        assert hist.max() == 0.5
+        assert abs(hist.total() - (98 * 0.000003 + 0.501)) < 1e-9
+        assert hist.percentile(50) == 0.000004
+        assert 0.001 <= hist.percentile(99) < 0.002
+        assert hist.percentile(100) == 0.5
+        assert sum(count for bound, count in hist.buckets()) == 100
+
+        # very long durations end up in the last bucket
+        hist.record(1e6)
+        assert hist.buckets()[-1][1] == 1
+
+        seconds, faults = Probe().stop()
+        assert seconds >= 0
+        assert faults is None or (faults[0] >= 0 and faults[1] >= 0)
+        assert (page_faults() is None) == (faults is None)
+
+    def test_tracing(self):
+        with FileCreator(self.k_window_test_size, "trace_test") as fc:
+            size = fc.size
+            man = SlidingWindowMapManager(window_size=size // 10)
+            assert man.tracer() is None
+            tracer = _RecordingTracer()
+            assert man.set_tracer(tracer) is None
+            assert man.tracer() is tracer
+
+            c = man.make_cursor(fc.path)
+            assert len(c.read(0, 100)) == 100
+            assert c.readinto(size - 10, bytearray(20)) == 10
+            assert [call[0] for call in tracer.calls] == ['map', 'read', 'map', 'read']
+            assert tracer.calls[1][1:3] == (0, 100)
+            assert tracer.calls[3][1:3] == (size - 10, 10)
+
+            c.unuse_region()
+            assert man.collect() == 2
+            assert [call[0] for call in tracer.calls[-2:]] == ['unmap', 'unmap']
+
+            # histograms summarize all operations
+            hist_tracer = HistogramTracer()
+            assert man.set_tracer(hist_tracer) is tracer
+            assert len(c.read(0, size)) == size
+            c.unuse_region()
+            man.collect()
+            snapshot = hist_tracer.snapshot()
+            assert snapshot['read']['count'] == 1
+            assert snapshot['map']['count'] == snapshot['unmap']['count'] == 10
+            assert hist_tracer.histogram('map').count() == 10
+            for op in hist_tracer.operations:
+                assert snapshot[op]['p50'] <= snapshot[op]['p99'] <= snapshot[op]['max']
+                assert snapshot[op]['minflt'] >= 0 and snapshot[op]['majflt'] >= 0
+            # END for each operation
+
+            # nothing is traced once it is disabled
+            man.set_tracer(None)
+            c.read(0, 100)
+            assert hist_tracer.snapshot()['read']['count'] == 1
+
+            # sharded managers trace all shards
+            man = ShardedWindowMapManager(num_shards=2, window_size=size // 10)
+            man.set_tracer(hist_tracer)
+            assert all(shard.tracer() is hist_tracer for shard in man.shards())
+            c = man.make_cursor(fc.path)
+            c.read(0, 100)
+            assert hist_tracer.snapshot()['map']['count'] == 11
@@ -4,7 +4,13 @@ from smmap.util import (
     MapWindow,
     MapRegion,
     MapRegionList,
+    AccessPattern,
     ALLOCATIONGRANULARITY,
+    MADV_RANDOM,
+    ACCESS_READ,
+    ACCESS_WRITE,
+    ACCESS_COPY,
+    HUGE_PAGE_SIZE,
     is_64_bit,
     align_to_mmap
 )
@@ -74,14 +80,43 @@ class TestMMan(TestBase):
             assert rhalfofs.ofs_begin() == rofs and rhalfofs.size() == fc.size - rofs
             assert rhalfsize.ofs_begin() == 0 and rhalfsize.size() == half_size
 
+            # a known file size is used to clamp the size
+            assert MapRegion(fc.path, rofs, sys.maxsize, file_size=fc.size).size() == fc.size - rofs
+
             assert rfull.includes_ofs(0) and rfull.includes_ofs(fc.size - 1) and rfull.includes_ofs(half_size)
             assert not rfull.includes_ofs(-1) and not rfull.includes_ofs(sys.maxsize)
 
+            # only writable regions track the range written to
+            assert rfull.access() == ACCESS_READ and not rfull.is_dirty()
+            assert rfull.mark_dirty(0, 10) == 0 and rfull.flush() == 0
+            assert MapRegion(fc.path, 0, half_size, access=ACCESS_COPY).mark_dirty(0, 10) == 0
+            rw = MapRegion(fc.path, rofs, half_size, access=ACCESS_WRITE)
+            assert rw.mark_dirty(100, 10) == 10
+            assert rw.mark_dirty(105, 10) == 5
+            assert rw.mark_dirty(0, 5) == 100
+            assert rw.is_dirty() and rw.dirty_size() == 115
+            assert rw.flush() == 115
+            assert not rw.is_dirty() and rw.flush() == 0
+            rw.increment_client_count(-1)
+
+            # huge pages and prefaulting are hints which work everywhere
+            rhuge = MapRegion(fc.path, 0, fc.size, huge_pages=True, populate=True)
+            assert rhuge.size() == fc.size and rhuge.buffer()[fc.size - 1] == ord('1')
+            rhuge.increment_client_count(-1)
+
         # auto-refcount
         assert rfull.client_count() == 1
         rfull2 = rfull
         assert rfull.client_count() == 1, "no auto-counting"
 
+        # access pattern hints are optional
+        assert rfull.advice() is None
+        assert not rfull.advise(None)
+        if MADV_RANDOM is not None:
+            assert rfull.advise(MADV_RANDOM)
+            assert rfull.advice() == MADV_RANDOM
+        # END handle platform support
+
         # window constructor
         w = MapWindow.from_region(rfull)
         assert w.ofs == rfull.ofs_begin() and w.ofs_end() == rfull.ofs_end()
@@ -99,7 +134,74 @@ class TestMMan(TestBase):
             finally:
                 os.close(fd)
 
+        # regions are kept sorted, and are found by offset
+        with FileCreator(ALLOCATIONGRANULARITY * 10, "sample_file") as fc:
+            ml = MapRegionList(fc.path)
+            assert ml.find_region(0) is None
+            assert ml.insert_position(100) == 0
+            regions = [MapRegion(fc.path, ALLOCATIONGRANULARITY * i, ALLOCATIONGRANULARITY) for i in (4, 0, 8, 2)]
+            for r in regions:
+                ml.insert_region(r)
+            # END for each region
+            assert [r.ofs_begin() for r in ml] == [0, ALLOCATIONGRANULARITY * 2, ALLOCATIONGRANULARITY * 4,
+                                                  ALLOCATIONGRANULARITY * 8]
+            assert list(ml._starts) == [r.ofs_begin() for r in ml]
+            assert ml.insert_position(ALLOCATIONGRANULARITY * 3) == 2
+
+            for r in regions:
+                for ofs in (r.ofs_begin(), r.ofs_end() - 1):
+                    assert ml.find_region(ofs) is r
+                    assert ml.find_region(ofs) is r     # cached
+                # END for each offset
+            # END for each region
+            assert ml.find_region(ALLOCATIONGRANULARITY) is None
+            assert ml.find_region(ALLOCATIONGRANULARITY * 10) is None
+
+            ml.remove_region(regions[0])
+            assert ml.find_region(regions[0].ofs_begin()) is None
+            self.assertRaises(ValueError, ml.remove_region, regions[0])
+            assert len(ml) == len(ml._starts) == 3
+            for r in regions[1:]:
+                ml.remove_region(r)
+            # END for each region
+            assert len(ml) == 0 and len(ml._starts) == 0
+
+    def test_access_pattern(self):
+        class Region:
+            _b = 0
+            _size = 100
+        # END region stub
+        region = Region()
+        wsize = ALLOCATIONGRANULARITY * 4
+
+        # sequential access
+        pattern = AccessPattern(wsize)
+        assert pattern.window_size() == wsize
+        done = False
+        ofs = 0
+        while not done:
+            done = pattern.record(ofs, 10, region, False)
+            ofs += wsize
+        # END record sample
+        assert pattern.adjust(0, wsize * 2) == wsize * 2
+        # the window doesn't grow beyond the maximum
+        for i in range(AccessPattern.sample_size):
+            pattern.record(ofs + i * wsize, 10, region, False)
+        assert pattern.adjust(0, wsize * 2) == wsize * 2
+
+        # random access without reusing windows
+        for i in range(AccessPattern.sample_size):
+            pattern.record((i % 2) * wsize * 100, 10, region, False)
+        assert pattern.adjust(ALLOCATIONGRANULARITY, wsize * 2) == wsize
+
+        # random access reusing windows keeps the size
+        for i in range(AccessPattern.sample_size):
+            pattern.record((i % 2) * wsize * 100, 10, region, True)
+        assert pattern.adjust(ALLOCATIONGRANULARITY, wsize * 2) == wsize
+
     def test_util(self):
         assert isinstance(is_64_bit(), bool)    # just call it
         assert align_to_mmap(1, False) == 0
         assert align_to_mmap(1, True) == ALLOCATIONGRANULARITY
+        assert align_to_mmap(HUGE_PAGE_SIZE + 1, False, HUGE_PAGE_SIZE) == HUGE_PAGE_SIZE
+        assert align_to_mmap(HUGE_PAGE_SIZE + 1, True, HUGE_PAGE_SIZE) == 2 * HUGE_PAGE_SIZE
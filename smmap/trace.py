@@ -0,0 +1,206 @@
+"""Module with hooks to measure how long mapping, unmapping and reading take, and how many page faults they cause"""
+from threading import Lock
+from time import perf_counter
+
+try:
+    import resource
+    # the counters of the calling thread are more precise, but only available on linux
+    _RUSAGE_WHO = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+except ImportError:
+    # page faults cannot be sampled on this platform
+    resource = None
+# END handle resource module
+
+__all__ = ["page_faults", "Probe", "Tracer", "LatencyHistogram", "HistogramTracer"]
+
+#{ Utilities
+
+
+def page_faults():
+    """:return: tuple(minor, major) page faults of the calling thread, or of the whole process if the
+        platform doesn't count them per thread. None if they cannot be obtained"""
+    if resource is None:
+        return None
+    # END handle no support
+    usage = resource.getrusage(_RUSAGE_WHO)
+    return usage.ru_minflt, usage.ru_majflt
+
+#} END utilities
+
+
+class Probe:
+
+    """Measures the time passed and page faults caused from its creation up to a call to stop()"""
+    __slots__ = (
+        '_start',   # perf_counter() at our creation
+        '_faults',  # page_faults() at our creation
+    )
+
+    def __init__(self):
+        self._faults = page_faults()
+        self._start = perf_counter()
+
+    def stop(self):
+        """:return: tuple(seconds, faults) with the seconds passed since our creation and faults being
+            tuple(minor, major) with the amount of page faults caused in the meanwhile, or None"""
+        seconds = perf_counter() - self._start
+        faults = self._faults
+        if faults is not None:
+            now = page_faults()
+            faults = (now[0] - faults[0], now[1] - faults[1])
+        # END handle faults
+        return seconds, faults
+
+
+class Tracer:
+
+    """Interface of tracers which are informed about operations of a memory manager, see
+    StaticWindowMapManager.set_tracer(). All methods do nothing, subclasses override the ones they need.
+
+    Mapping and unmapping are reported while the manager's lock is held, reads are reported by the
+    thread using the cursor. In all methods, faults is tuple(minor, major) with the amount of page faults
+    caused during the operation, or None if they cannot be sampled on this platform"""
+    __slots__ = tuple()
+
+    #{ Interface
+
+    def mapped(self, region, regions, seconds, faults):
+        """Called once the given region of the given MapRegionList was newly mapped, which took the
+        given amount of seconds"""
+
+    def unmapped(self, region, regions, seconds, faults):
+        """Called once the given region was unmapped, including writing its changes to the file"""
+
+    def read(self, regions, offset, size, seconds, faults):
+        """Called once a cursor copied the given amount of bytes at the given absolute offset out of the
+        file of the given MapRegionList. This includes mapping windows if required"""
+
+    #} END interface
+
+
+class LatencyHistogram:
+
+    """Counts durations in buckets whose upper bounds are powers of two microseconds"""
+    __slots__ = (
+        '_buckets',     # list of counts, bucket i counts durations up to 2 ** i microseconds
+        '_count',       # total amount of recorded durations
+        '_total',       # sum of all recorded durations in seconds
+        '_max',         # longest recorded duration in seconds
+    )
+
+    #{ Configuration
+    num_buckets = 32    # the last bucket counts all durations longer than about 35 minutes
+    #} END configuration
+
+    def __init__(self):
+        self._buckets = [0] * self.num_buckets
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, seconds):
+        """Count the given duration"""
+        i = min(int(seconds * 1e6).bit_length(), self.num_buckets - 1)
+        self._buckets[i] += 1
+        self._count += 1
+        self._total += seconds
+        if seconds > self._max:
+            self._max = seconds
+        # END handle maximum
+
+    def count(self):
+        """:return: amount of recorded durations"""
+        return self._count
+
+    def total(self):
+        """:return: sum of all recorded durations in seconds"""
+        return self._total
+
+    def max(self):
+        """:return: longest recorded duration in seconds"""
+        return self._max
+
+    def buckets(self):
+        """:return: list of tuple(upper_bound, count) with the upper bound of each bucket in seconds"""
+        return [((1 << i) / 1e6, count) for i, count in enumerate(self._buckets)]
+
+    def percentile(self, percent):
+        """:return: upper bound in seconds of the bucket containing the given percentile, like 99 for p99,
+            or 0.0 if nothing was recorded"""
+        if not self._count:
+            return 0.0
+        # END handle empty histogram
+        rank = self._count * percent / 100.0
+        seen = 0
+        for i, count in enumerate(self._buckets):
+            seen += count
+            if seen >= rank and count:
+                return min((1 << i) / 1e6, self._max)
+            # END found bucket
+        # END for each bucket
+        return self._max
+
+
+class HistogramTracer(Tracer):
+
+    """A tracer keeping a latency histogram and page fault totals for each kind of operation,
+    which are 'map', 'unmap' and 'read'"""
+    __slots__ = (
+        '_histograms',  # mapping of operation -> LatencyHistogram
+        '_faults',      # mapping of operation -> [minor, major] page faults
+        '_lock',        # lock protecting our state, as reads are reported by multiple threads
+    )
+
+    #{ Configuration
+    LatencyHistogramCls = LatencyHistogram
+    #} END configuration
+
+    operations = ('map', 'unmap', 'read')
+
+    def __init__(self):
+        self._histograms = {op: self.LatencyHistogramCls() for op in self.operations}
+        self._faults = {op: [0, 0] for op in self.operations}
+        self._lock = Lock()
+
+    def _record(self, op, seconds, faults):
+        with self._lock:
+            self._histograms[op].record(seconds)
+            if faults is not None:
+                totals = self._faults[op]
+                totals[0] += faults[0]
+                totals[1] += faults[1]
+            # END handle faults
+
+    #{ Tracer Interface
+
+    def mapped(self, region, regions, seconds, faults):
+        self._record('map', seconds, faults)
+
+    def unmapped(self, region, regions, seconds, faults):
+        self._record('unmap', seconds, faults)
+
+    def read(self, regions, offset, size, seconds, faults):
+        self._record('read', seconds, faults)
+
+    #} END tracer interface
+
+    #{ Interface
+
+    def histogram(self, op):
+        """:return: the LatencyHistogram of the given operation"""
+        return self._histograms[op]
+
+    def snapshot(self):
+        """:return: dict of operation -> dict with count, total, max, p50, p99 in seconds, and the
+            amount of minor and major faults caused by the operation"""
+        with self._lock:
+            res = dict()
+            for op, hist in self._histograms.items():
+                minflt, majflt = self._faults[op]
+                res[op] = dict(count=hist.count(), total=hist.total(), max=hist.max(),
+                               p50=hist.percentile(50), p99=hist.percentile(99),
+                               minflt=minflt, majflt=majflt)
+            # END for each operation
+        return res
+
+    #} END interface
@@ -1,26 +1,56 @@
 """Module containing a memory memory manager which provides a sliding window on a number of memory mapped files"""
 import os
 import sys
+from array import array
+from bisect import bisect_left, bisect_right
 
-from mmap import mmap, ACCESS_READ
+from mmap import mmap, ACCESS_READ, ACCESS_WRITE, ACCESS_COPY, PAGESIZE
 from mmap import ALLOCATIONGRANULARITY
 
+try:
+    from mmap import MADV_NORMAL, MADV_RANDOM, MADV_SEQUENTIAL, MADV_WILLNEED, MADV_DONTNEED
+except ImportError:
+    # madvise is not available on this platform or python version - hints will be ignored
+    MADV_NORMAL = MADV_RANDOM = MADV_SEQUENTIAL = MADV_WILLNEED = MADV_DONTNEED = None
+# END handle madvise
+
+try:
+    from mmap import MADV_HUGEPAGE
+except ImportError:
+    # transparent huge pages are only available on linux
+    MADV_HUGEPAGE = None
+# END handle huge pages
+
+try:
+    from mmap import MAP_POPULATE, MAP_SHARED, MAP_PRIVATE, PROT_READ, PROT_WRITE
+except ImportError:
+    # mapped pages cannot be populated right away, they will be advised with MADV_WILLNEED instead
+    MAP_POPULATE = None
+# END handle populate
+
+#: size of a huge page, the alignment of windows of managers using huge pages
+HUGE_PAGE_SIZE = 2 * 1024 * 1024
+
 __all__ = ["align_to_mmap", "is_64_bit",
-           "MapWindow", "MapRegion", "MapRegionList", "ALLOCATIONGRANULARITY"]
+           "MapWindow", "MapRegion", "MapRegionList", "AccessPattern", "ALLOCATIONGRANULARITY",
+           "ACCESS_READ", "ACCESS_WRITE", "ACCESS_COPY", "HUGE_PAGE_SIZE",
+           "MADV_NORMAL", "MADV_RANDOM", "MADV_SEQUENTIAL", "MADV_WILLNEED", "MADV_DONTNEED", "MADV_HUGEPAGE"]
 
 #{ Utilities
 
 
-def align_to_mmap(num, round_up):
+def align_to_mmap(num, round_up, alignment=ALLOCATIONGRANULARITY):
     """
     Align the given integer number to the closest page offset, which usually is 4096 bytes.
 
     :param round_up: if True, the next higher multiple of page size is used, otherwise
         the lower page_size will be used (i.e. if True, 1 becomes 4096, otherwise it becomes 0)
+    :param alignment: the page size to align to, which must be a multiple of ALLOCATIONGRANULARITY,
+        like HUGE_PAGE_SIZE
     :return: num rounded to closest page"""
-    res = (num // ALLOCATIONGRANULARITY) * ALLOCATIONGRANULARITY
+    res = (num // alignment) * alignment
     if round_up and (res != num):
-        res += ALLOCATIONGRANULARITY
+        res += alignment
     # END handle size
     return res
 
@@ -57,12 +87,13 @@ class MapWindow:
     def ofs_end(self):
         return self.ofs + self.size
 
-    def align(self):
-        """Assures the previous window area is contained in the new one"""
-        nofs = align_to_mmap(self.ofs, 0)
+    def align(self, alignment=ALLOCATIONGRANULARITY):
+        """Assures the previous window area is contained in the new one
+        :param alignment: page size to align offset and size to, see align_to_mmap()"""
+        nofs = align_to_mmap(self.ofs, 0, alignment)
         self.size += self.ofs - nofs    # keep size constant
         self.ofs = nofs
-        self.size = align_to_mmap(self.size, 1)
+        self.size = align_to_mmap(self.size, 1, alignment)
 
     def extend_left_to(self, window, max_size):
         """Adjust the offset to start where the given window on our left ends if possible,
@@ -88,42 +119,74 @@ class MapRegion:
     __slots__ = [
         '_b',   # beginning of mapping
         '_mf',  # mapped memory chunk (as returned by mmap)
-        '_uc',  # total amount of usages
+        '_uc',  # amount of usages by the manager and clients which acquired us while holding its lock
+        '_pins',  # list with one item per cursor using us, modified without holding the manager's lock
+        '_detached',  # True if the manager's eviction policy doesn't know us, as we are in use or unmapped
         '_size',  # cached size of our memory map
+        '_hits',  # amount of times a client started using us
+        '_tick',  # logical time of our last use, as provided by the eviction policy
+        '_advice',  # the last access pattern hint given to the kernel, or None
+        '_access',  # access mode of our memory map, one of the mmap.ACCESS_* constants
+        '_dirty',   # [begin, end) of the relative range written since the last flush, or None
+        '_view',    # cached read-only memoryview of our whole memory, or None
         '__weakref__'
     ]
 
     #{ Configuration
     #} END configuration
 
-    def __init__(self, path_or_fd, ofs, size, flags=0):
+    def __init__(self, path_or_fd, ofs, size, flags=0, file_size=None, access=ACCESS_READ, huge_pages=False,
+                 populate=False):
         """Initialize a region, allocate the memory map
         :param path_or_fd: path to the file to map, or the opened file descriptor
         :param ofs: **aligned** offset into the file to be mapped
         :param size: if size is larger then the file on disk, the whole file will be
             allocated the the size automatically adjusted
         :param flags: additional flags to be given when opening the file.
+        :param file_size: the size of the file if known, which saves a system call to obtain it
+        :param access: ACCESS_READ, ACCESS_WRITE to write changes to the file, or ACCESS_COPY to keep
+            changes private to this region. They are lost once the region is released
+        :param huge_pages: if True, ask the kernel to back the region with transparent huge pages if possible
+        :param populate: if True, read all pages of the region while mapping it, so that accessing
+            them later will not fault. If not supported, the kernel is advised to read them in the background
         :raise Exception: if no memory can be allocated"""
         self._b = ofs
         self._size = 0
         self._uc = 0
+        self._pins = list()
+        self._detached = False
+        self._hits = 0
+        self._tick = 0
+        self._advice = None
+        self._access = access
+        self._dirty = None
+        self._view = None
 
         if isinstance(path_or_fd, int):
             fd = path_or_fd
         else:
-            fd = os.open(path_or_fd, os.O_RDONLY | getattr(os, 'O_BINARY', 0) | flags)
+            mode = os.O_RDWR if access == ACCESS_WRITE else os.O_RDONLY
+            fd = os.open(path_or_fd, mode | getattr(os, 'O_BINARY', 0) | flags)
         # END handle fd
 
         try:
-            kwargs = dict(access=ACCESS_READ, offset=ofs)
+            kwargs = dict(access=access, offset=ofs)
             corrected_size = size
             sizeofs = ofs
 
             # have to correct size, otherwise (instead of the c version) it will
-            # bark that the size is too large ... many extra file accesses because
-            # if this ... argh !
-            actual_size = min(os.fstat(fd).st_size - sizeofs, corrected_size)
-            self._mf = mmap(fd, actual_size, **kwargs)
+            # bark that the size is too large
+            if file_size is None:
+                file_size = os.fstat(fd).st_size
+            # END obtain file size
+            actual_size = min(file_size - sizeofs, corrected_size)
+            if populate and MAP_POPULATE is not None:
+                # populating requires specifying the mapping by flags instead of access mode
+                mflags = MAP_PRIVATE if access == ACCESS_COPY else MAP_SHARED
+                prot = PROT_READ if access == ACCESS_READ else PROT_READ | PROT_WRITE
+                self._mf = mmap(fd, actual_size, mflags | MAP_POPULATE, prot, offset=ofs)
+            else:
+                self._mf = mmap(fd, actual_size, **kwargs)
             # END handle memory mode
 
             self._size = len(self._mf)
@@ -132,9 +195,29 @@ class MapRegion:
                 os.close(fd)
             # END only close it if we opened it
         # END close file handle
+        if huge_pages:
+            self._madvise(MADV_HUGEPAGE)
+        # END handle huge pages
+        if populate and MAP_POPULATE is None:
+            self._madvise(MADV_WILLNEED)
+        # END prefault pages
+
         # We assume the first one to use us keeps us around
         self.increment_client_count()
 
+    def _madvise(self, advice):
+        """Pass the given advice to the kernel
+        :return: True if it was given, False if it is not supported"""
+        if advice is None:
+            return False
+        # END handle no advice
+        try:
+            self._mf.madvise(advice)
+        except (AttributeError, OSError, ValueError):
+            return False
+        # END handle unsupported advice
+        return True
+
     def __repr__(self):
         return "MapRegion<%i, %i>" % (self._b, self.size())
 
@@ -148,6 +231,23 @@ class MapRegion:
         """:return: a memory map containing the memory"""
         return self._mf
 
+    def view(self):
+        """:return: a read-only memoryview of our whole memory. It is created once and shared by all callers,
+            and released together with our memory map
+
+        **Note:** slices of the view keep the memory map alive even after we were released"""
+        view = self._view
+        if view is None:
+            view = memoryview(self._mf)
+            if not view.readonly and hasattr(view, 'toreadonly'):
+                base = view
+                view = base.toreadonly()
+                base.release()
+            # END make read-only
+            self._view = view
+        # END create view
+        return view
+
     def ofs_begin(self):
         """:return: absolute byte offset to the first byte of the mapping"""
         return self._b
@@ -166,7 +266,15 @@ class MapRegion:
 
     def client_count(self):
         """:return: number of clients currently using this region"""
-        return self._uc
+        return self._uc + len(self._pins)
+
+    def hit_count(self):
+        """:return: amount of times a client started using this region"""
+        return self._hits
+
+    def last_access(self):
+        """:return: logical time at which a client started using this region the last time, or 0"""
+        return self._tick
 
     def increment_client_count(self, ofs = 1):
         """Adjust the usage count by the given positive or negative offset.
@@ -175,39 +283,217 @@ class MapRegion:
         self._uc += ofs
         assert self._uc > -1, "Increments must match decrements, usage counter negative: %i" % self._uc
 
-        if self.client_count() == 0:
+        if self._uc == 0:
             self.release()
             return True
         else:
             return False
         # end handle release
 
+    def advice(self):
+        """:return: the last access pattern hint given for this region, or None"""
+        return self._advice
+
+    def advise(self, advice):
+        """Tell the kernel how our memory is going to be accessed, see mmap.madvise
+        :param advice: one of the MADV_* constants of this module, or None
+        :return: True if the hint was given, False if the platform doesn't support it"""
+        if not self._madvise(advice):
+            return False
+        # END handle unsupported advice
+        self._advice = advice
+        return True
+
+    def access(self):
+        """:return: access mode of our memory map, one of the mmap.ACCESS_* constants"""
+        return self._access
+
+    def is_dirty(self):
+        """:return: True if bytes were written to our memory since the last flush()"""
+        return self._dirty is not None
+
+    def dirty_size(self):
+        """:return: amount of bytes in the range written to since the last flush()"""
+        if self._dirty is None:
+            return 0
+        return self._dirty[1] - self._dirty[0]
+
+    def mark_dirty(self, ofs, size):
+        """Record that the given range was written to, so that it will be written to the file by flush().
+        Only regions mapped using ACCESS_WRITE can become dirty
+        :param ofs: offset relative to the beginning of the region
+        :return: amount of bytes by which our dirty range grew"""
+        if self._access != ACCESS_WRITE or size <= 0:
+            return 0
+        # END handle no write back
+        dirty = self._dirty
+        if dirty is None:
+            self._dirty = [ofs, ofs + size]
+            return size
+        # END handle clean region
+        old_size = dirty[1] - dirty[0]
+        dirty[0] = min(dirty[0], ofs)
+        dirty[1] = max(dirty[1], ofs + size)
+        return dirty[1] - dirty[0] - old_size
+
+    def flush(self):
+        """Write the range marked dirty to the file, see mark_dirty()
+        :return: amount of bytes which were dirty"""
+        dirty = self._dirty
+        if dirty is None:
+            return 0
+        # END handle clean region
+        # flushing has to start at a page boundary
+        begin = (dirty[0] // PAGESIZE) * PAGESIZE
+        self._mf.flush(begin, dirty[1] - begin)
+        self._dirty = None
+        return dirty[1] - dirty[0]
+
     def release(self):
         """Release all resources this instance might hold. Must only be called if there usage_count() is zero"""
-        self._mf.close()
+        if self._view is not None:
+            try:
+                self._view.release()
+            except BufferError:
+                # the view is still exported, like to struct.iter_unpack - it is released once unreferenced
+                pass
+            # END handle exported view
+            self._view = None
+        # END release view
+        try:
+            self._mf.close()
+        except BufferError:
+            # memoryviews of our memory are still alive - it is unmapped once the last of them is gone
+            pass
+        # END handle exported memory
 
     #} END interface
 
 
+class AccessPattern:
+
+    """Observes how the windows of a file are accessed to adjust their size. Files which are read
+    sequentially, or whose reads often span windows, get larger windows. Files which are accessed at
+    random offsets without reusing their windows get smaller ones"""
+    __slots__ = (
+        '_window_size',     # size of windows to map for the file
+        '_last_ofs',        # offset of the last recorded access, or None
+        '_num_accesses',    # amount of accesses recorded since the last adjustment
+        '_num_sequential',  # amount of accesses a bit after the previous one
+        '_num_random',      # amount of accesses far away from the previous one
+        '_num_crossing',    # amount of accesses which didn't fit into the window they used
+        '_num_hits',        # amount of accesses to windows which were mapped already
+    )
+
+    #{ Configuration
+    sample_size = 16    # amount of accesses after which the window size is adjusted
+    #} END configuration
+
+    def __init__(self, window_size):
+        self._window_size = window_size
+        self._last_ofs = None
+        self._reset()
+
+    def _reset(self):
+        self._num_accesses = 0
+        self._num_sequential = 0
+        self._num_random = 0
+        self._num_crossing = 0
+        self._num_hits = 0
+
+    def window_size(self):
+        """:return: size of the windows to map for the file"""
+        return self._window_size
+
+    def record(self, offset, size, region, is_hit):
+        """Record that size bytes at the given absolute offset were requested, and were found in the given region
+        :param is_hit: True if the region was mapped already
+        :return: True if enough accesses were recorded to adjust the window size using adjust()"""
+        last = self._last_ofs
+        if last is not None:
+            stride = offset - last
+            if 0 < stride <= 2 * self._window_size:
+                self._num_sequential += 1
+            elif abs(stride) > 2 * self._window_size:
+                self._num_random += 1
+            # END classify stride
+        # END handle previous access
+        if offset + size > region._b + region._size:
+            self._num_crossing += 1
+        # END handle crossing access
+        self._num_hits += is_hit
+        self._num_accesses += 1
+        self._last_ofs = offset
+        return self._num_accesses >= self.sample_size
+
+    def adjust(self, min_size, max_size):
+        """Double or halve the window size according to the recorded accesses, within the given bounds,
+        and start recording anew
+        :return: the new window size"""
+        n = self._num_accesses
+        window_size = self._window_size
+        if (self._num_sequential + self._num_crossing) * 4 >= n * 3:
+            window_size *= 2
+        elif self._num_random * 4 >= n * 3 and self._num_hits * 2 < n:
+            window_size = align_to_mmap(window_size // 2, True)
+        # END choose direction
+        self._window_size = max(min(window_size, max_size), min_size)
+        self._reset()
+        return self._window_size
+
+
 class MapRegionList(list):
 
-    """List of MapRegion instances associating a path with a list of regions."""
+    """List of MapRegion instances associating a path with a list of regions.
+    The regions are sorted by their offset, which is additionally kept in a compact array
+    to find regions and insert positions by bisection.
+
+    **Note:** regions must be added and removed using insert_region() and remove_region() only"""
     __slots__ = (
         '_path_or_fd',  # path or file descriptor which is mapped by all our regions
-        '_file_size'    # total size of the file we map
+        '_file_size',   # total size of the file we map
+        '_starts',      # array with the offset of each of our regions, in order
+        '_hit',         # the region last returned by find_region(), or None
+        '_fd',          # file descriptor kept open by the manager to map our file, or None
+        '_access',      # access mode all our regions are mapped with
+        '_num_hits',    # amount of times a cursor started using one of our existing regions
+        '_num_maps',    # amount of regions mapped for this file
+        '_num_evictions',  # amount of our regions unmapped to free resources
+        '_pattern',     # AccessPattern adjusting the size of our windows, or None if it is fixed
     )
 
-    def __new__(cls, path):
+    def __new__(cls, path, access=ACCESS_READ):
         return super().__new__(cls)
 
-    def __init__(self, path_or_fd):
+    def __init__(self, path_or_fd, access=ACCESS_READ):
         self._path_or_fd = path_or_fd
+        self._access = access
+        self._num_hits = 0
+        self._num_maps = 0
+        self._num_evictions = 0
+        self._pattern = None
         self._file_size = None
+        self._starts = array('Q')
+        self._hit = None
+        self._fd = None
 
     def path_or_fd(self):
         """:return: path or file descriptor we are attached to"""
         return self._path_or_fd
 
+    def access(self):
+        """:return: the mmap.ACCESS_* constant all our regions are mapped with"""
+        return self._access
+
+    def stats(self):
+        """:return: dict with statistics about the regions of our file, see StaticWindowMapManager.stats()"""
+        stats = dict(hits=self._num_hits, maps=self._num_maps, evictions=self._num_evictions,
+                     regions=len(self), mapped_memory_size=sum(r._size for r in self))
+        if self._pattern is not None:
+            stats['window_size'] = self._pattern.window_size()
+        # END handle adaptive windows
+        return stats
+
     def file_size(self):
         """:return: size of file we manager"""
         if self._file_size is None:
@@ -219,4 +505,57 @@ class MapRegionList(list):
         # END update file size
         return self._file_size
 
+    def refresh_file_size(self):
+        """Obtain the size of our file again, as it might have changed since it was first queried
+        :return: the current file size"""
+        if self._fd is not None:
+            self._file_size = os.fstat(self._fd).st_size
+            return self._file_size
+        # END use open file
+        self._file_size = None
+        return self.file_size()
+
+    def find_region(self, offset):
+        """:return: the region including the given absolute offset, or None if there is no such region"""
+        r = self._hit
+        # the cached region may have been unmapped by now if we are searched without holding the manager's lock
+        if r is not None and r._b <= offset < r._b + r._size and r._uc:
+            return r
+        # END handle cached region
+        i = bisect_right(self._starts, offset) - 1
+        if i > -1:
+            r = self[i]
+            if offset < r._b + r._size:
+                self._hit = r
+                return r
+            # END handle region includes offset
+        # END handle region found
+        return None
+
+    def insert_position(self, offset):
+        """:return: index at which a region starting at the given offset would have to be inserted"""
+        return bisect_right(self._starts, offset)
+
+    def insert_region(self, region):
+        """Insert the given region at the position matching its offset
+        :return: index at which the region was inserted"""
+        i = bisect_right(self._starts, region._b)
+        self.insert(i, region)
+        self._starts.insert(i, region._b)
+        return i
+
+    def remove_region(self, region):
+        """Remove the given region from this list. As regions are sorted by their offset,
+        the region is found by bisection.
+        :raise ValueError: if the region is not part of this list"""
+        i = bisect_left(self._starts, region._b)
+        if i == len(self) or self[i] is not region:
+            raise ValueError("%r is not part of this list" % region)
+        # END handle unknown region
+        del self[i]
+        del self._starts[i]
+        if self._hit is region:
+            self._hit = None
+        # END forget cached region
+
 #} END utility classes